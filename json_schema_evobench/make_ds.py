@@ -1,11 +1,42 @@
 import os
+import sys
 import json
 import random
+import threading
+import itertools
+from functools import partial
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from datasets import load_dataset
 from faker import Faker
-from copy import deepcopy
 
 fake = Faker()
+fake.seed_instance(0)  # 固定词表，保证各工作进程生成的词表一致
+# 预生成词表，生成文档时绕过 Faker 的 provider 分发
+_WORDS = tuple(dict.fromkeys(fake.words(nb=512)))
+# 随机源按线程隔离，见 _rng()
+_tls = threading.local()
+
+
+def _rng():
+    """返回当前线程独享的 random.Random，多线程生成时互不争用"""
+    rng = getattr(_tls, "rng", None)
+    if rng is None:
+        rng = _tls.rng = random.Random()
+    return rng
+
+
+# 只读默认值，避免在热循环中每次调用都分配新的 dict
+_EMPTY = {}
+_DEFAULT_STRING_ITEM = {"type": "string"}
+
+# 基础类型取值函数，按 type 字符串直接查表分派，参数为随机源
+_PRIMITIVE_GEN = {
+    "string": lambda rng: rng.choice(_WORDS),
+    "integer": lambda rng: rng.randint(0, 100),
+    "number": lambda rng: rng.randrange(100000) / 100.0,
+    "boolean": lambda rng: rng.random() < 0.5,
+}
 
 # ---------- 配置 ----------
 DATASET_NAME = "epfl-dlab/JSONSchemaBench"
@@ -14,47 +45,88 @@ OUTPUT_DIR = "./evolved_dataset"
 NUM_VERSIONS = 5  # 每个初始 schema 生成多少个演化版本
 NUM_DOCS_PER_VERSION = 5  # 每个版本生成多少 JSON 文档
 
-# 禁用 Hugging Face 符号链接警告
-os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "true"
+MAX_DEPTH = 8  # 生成文档时的最大嵌套深度，超出部分的值为 None
 
-# ---------- 加载数据集 ----------
-try:
-    ds = load_dataset(DATASET_NAME, name=SUBSET_NAME)
-    train_schemas = ds["train"]
-except Exception as e:
-    print(f"加载数据集失败: {e}")
-    exit(1)
+# 默认输出紧凑 JSON 以加快序列化；命令行传入 --pretty 时缩进输出，便于人工查看
+PRETTY_JSON = "--pretty" in sys.argv
+# 命令行传入 --debug 时打印数据集前几条样本
+DEBUG = "--debug" in sys.argv
 
-# 调试：检查数据集结构和前几行数据
-print(f"Dataset features: {train_schemas.features}")
-print(f"First 2 examples: {[train_schemas[i] for i in range(min(2, len(train_schemas)))]}")
+# 禁用 Hugging Face 符号链接警告
+os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "true"
 
 # ---------- 工具函数 ----------
+def save_json(obj, path):
+    """用 orjson 直接序列化为 UTF-8 字节，再一次性写入文件"""
+    try:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if PRETTY_JSON else 0)
+    except TypeError:  # 超出 64 位的整数等 orjson 无法序列化的值，交给标准库处理
+        if PRETTY_JSON:
+            data = json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+        else:
+            data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+
 def generate_example(schema):
-    """根据 JSON Schema 生成随机 JSON 文档"""
-    example = {}
-    for prop, definition in schema.get("properties", {}).items():
-        typ = definition.get("type", "string")
-        if typ == "string":
-            example[prop] = fake.word()
-        elif typ == "integer":
-            example[prop] = fake.random_int(min=0, max=100)
-        elif typ == "number":
-            example[prop] = fake.random_number(digits=5) / 100.0
-        elif typ == "boolean":
-            example[prop] = fake.boolean()
-        elif typ == "object":
-            example[prop] = generate_example(definition)
-        elif typ == "array":
-            items_def = definition.get("items", {"type": "string"})
-            example[prop] = [generate_example(items_def)]
-    return example
-
-
-def evolve_schema(schema, version_num):
-    """生成演化版本 Schema，示例包含基础字段和嵌套调整"""
-    new_schema = deepcopy(schema)
-    props = new_schema.get("properties", {})
+    """根据 JSON Schema 生成一份随机 JSON 文档；同一 schema 要生成多份时先 compile_generator 再反复调用"""
+    return compile_generator(schema)()
+
+
+def _primitive_array(rng, item_type, n):
+    """生成长度为 n 的基础类型数组，元素批量生成"""
+    if item_type == "string":
+        return rng.choices(_WORDS, k=n)
+    if item_type == "integer":
+        return [rng.randint(0, 100) for _ in range(n)]
+    if item_type == "number":
+        return [rng.randrange(100000) / 100.0 for _ in range(n)]
+    return [rng.random() < 0.5 for _ in range(n)]  # boolean
+
+
+def compile_generator(schema, _depth=0):
+    """将 schema 预编译为文档生成函数
+
+    字段遍历和类型分派只在编译时做一次，同一版本生成多个文档时直接调用返回的函数。
+    嵌套超过 MAX_DEPTH 层的对象取值为 None。
+    """
+    if _depth > MAX_DEPTH:
+        return lambda: None
+    fields = []
+    for prop, definition in schema.get("properties", _EMPTY).items():
+        gen = _compile_field(definition, _depth)
+        if gen is not None:
+            fields.append((prop, gen))
+    return lambda: {prop: gen() for prop, gen in fields}
+
+
+def _compile_field(definition, _depth):
+    """为单个字段生成取值函数，未知类型返回 None"""
+    rng = _rng()
+    typ = definition.get("type", "string")
+    gen = _PRIMITIVE_GEN.get(typ) if isinstance(typ, str) else None  # 联合类型（list）不可哈希，按未知类型跳过
+    if gen is not None:
+        return partial(gen, rng)
+    if typ == "object":
+        return compile_generator(definition, _depth + 1)
+    if typ == "array":
+        items_def = definition.get("items", _DEFAULT_STRING_ITEM)
+        item_type = items_def.get("type")
+        if isinstance(item_type, str) and item_type in _PRIMITIVE_GEN:
+            return lambda: _primitive_array(rng, item_type, 1)
+        item_gen = compile_generator(items_def, _depth + 1)
+        return lambda: [item_gen() for _ in range(1)]
+    return None
+
+
+def evolve_schema(props, version_num):
+    """生成演化版本的 properties，示例包含基础字段和嵌套调整
+
+    返回新的 properties 字典：未改动的字段直接复用原定义，只为被修改的字段分配新 dict，
+    因此各版本之间共享的子 schema 不会被原地修改。
+    """
+    props = dict(props)
+    field_names = list(props)  # 只生成一次字段名列表，各分支共用
 
     # 随机选择变更类型
     change_type = random.choice(["add_field", "remove_field", "rename_field", "type_change", "nest_field"])
@@ -65,89 +137,122 @@ def evolve_schema(schema, version_num):
         change_desc = f"新增字段 {new_field}"
 
     elif change_type == "remove_field" and props:
-        remove_field = random.choice(list(props.keys()))
+        remove_field = random.choice(field_names)
         props.pop(remove_field)
         change_desc = f"删除字段 {remove_field}"
 
     elif change_type == "rename_field" and props:
-        rename_field = random.choice(list(props.keys()))
+        rename_field = random.choice(field_names)
         new_name = rename_field + f"_v{version_num}"
-        props[new_name] = props.pop(rename_field)
+        # 重建字典完成重命名，新字段名保留在原位置，便于对比版本差异
+        props = {(new_name if k == rename_field else k): v for k, v in props.items()}
         change_desc = f"重命名字段 {rename_field} → {new_name}"
 
     elif change_type == "type_change" and props:
-        field = random.choice(list(props.keys()))
+        field = random.choice(field_names)
         old_type = props[field].get("type", "string")
         new_type = random.choice([t for t in ["string", "integer", "boolean", "number"] if t != old_type])
-        props[field]["type"] = new_type
+        props[field] = {**props[field], "type": new_type}
         change_desc = f"字段类型变更 {field}: {old_type} → {new_type}"
 
     elif change_type == "nest_field" and len(props) >= 2:
         # 简单嵌套：将两个字段合并为一个嵌套对象
-        keys = random.sample(list(props.keys()), 2)
-        nested_obj = {k: props.pop(k) for k in keys}
+        keys = random.sample(field_names, 2)
+        nested_obj = {k: props[k] for k in keys}
         new_key = f"nested_v{version_num}"
-        props[new_key] = {"type": "object", "properties": nested_obj}
+        props = {k: v for k, v in props.items() if k not in nested_obj} | {
+            new_key: {"type": "object", "properties": nested_obj}
+        }
         change_desc = f"嵌套调整字段 {keys} → {new_key}"
 
     else:
         change_desc = "无变更"
 
-    new_schema["properties"] = props
-    return new_schema, change_desc
+    return props, change_desc
 
 
 # ---------- 生成数据集 ----------
-# 强制转换为字典列表，避免迭代器问题
-train_schemas_subset = [train_schemas[i] for i in range(min(10, len(train_schemas)))]
-for idx, example in enumerate(train_schemas_subset):
+def process_entity(idx_example):
+    """处理单个实体：逐版本演化 schema，保存 schema、JSON 文档和变更日志"""
+    idx, example = idx_example
+    # 按实体编号设定随机种子，并行执行时每个实体的结果仍可复现
+    random.seed(idx)
+    _rng().seed(f"{idx}/docs")  # 文档生成用派生种子，与 schema 演化的随机序列相互独立
+
     entity_dir = os.path.join(OUTPUT_DIR, f"entity_{idx}")
     os.makedirs(entity_dir, exist_ok=True)
 
     # 检查 example 是否为字典
     if not isinstance(example, dict):
         print(f"跳过示例 {idx}: 预期为字典，实际为 {type(example)}: {example}")
-        continue
+        return
 
     # 获取 json_schema 字段
     schema_str = example.get("json_schema")
     if not schema_str:
         print(f"跳过示例 {idx}: 未找到 json_schema 字段")
-        continue
+        return
 
     # 解析 JSON Schema 字符串
     try:
         schema = json.loads(schema_str)
     except json.JSONDecodeError as e:
         print(f"跳过示例 {idx}: 无效的 JSON Schema - {e}")
-        continue
+        return
 
     log = []
+    # 循环开始前一次性创建所有版本目录，版本循环内不再逐个检查目录
+    version_dirs = [os.path.join(entity_dir, f"v{v}") for v in range(1, NUM_VERSIONS + 1)]
+    for schema_dir in version_dirs:
+        os.makedirs(schema_dir, exist_ok=True)
+    props = schema.get("properties", {})
 
     for v in range(1, NUM_VERSIONS + 1):
-        # 演化 Schema
-        evolved_schema, desc = evolve_schema(schema, v)
-        schema_dir = os.path.join(entity_dir, f"v{v}")
-        os.makedirs(schema_dir, exist_ok=True)
+        # 演化 Schema：只演化 properties，写文件前再组装完整 Schema
+        props, desc = evolve_schema(props, v)
+        evolved_schema = {**schema, "properties": props}
+        schema_dir = version_dirs[v - 1]
 
         # 保存 Schema
-        with open(os.path.join(schema_dir, "schema.json"), "w", encoding="utf-8") as f:
-            json.dump(evolved_schema, f, indent=2, ensure_ascii=False)
+        save_json(evolved_schema, os.path.join(schema_dir, "schema.json"))
 
-        # 生成 JSON 文档
+        # 生成 JSON 文档：每个版本只编译一次生成函数
+        generate = compile_generator(evolved_schema)
         for doc_id in range(1, NUM_DOCS_PER_VERSION + 1):
-            data = generate_example(evolved_schema)
-            with open(os.path.join(schema_dir, f"{doc_id}.json"), "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            data = generate()
+            save_json(data, os.path.join(schema_dir, f"{doc_id}.json"))
 
         # 记录变更日志
         log.append(f"v{v}: {desc}")
 
-        # 为下一版本使用当前版本 Schema
-        schema = evolved_schema
-
     # 保存日志
     with open(os.path.join(entity_dir, "change_log.txt"), "w", encoding="utf-8") as f:
         f.write("\n".join(log))
 
-print("生成完成！")
\ No newline at end of file
+
+def main():
+    # ---------- 加载数据集 ----------
+    try:
+        ds = load_dataset(DATASET_NAME, name=SUBSET_NAME)
+        train_schemas = ds["train"]
+    except Exception as e:
+        print(f"加载数据集失败: {e}")
+        exit(1)
+
+    # 调试：检查数据集结构和前几行数据
+    print(f"Dataset features: {train_schemas.features}")
+    if DEBUG:
+        print(f"First 2 examples: {list(itertools.islice(train_schemas, 2))}")
+
+    # 强制转换为字典列表，避免迭代器问题
+    train_schemas_subset = [train_schemas[i] for i in range(min(10, len(train_schemas)))]
+
+    # 各实体互不依赖，按实体分发到多进程并行生成
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(process_entity, enumerate(train_schemas_subset), chunksize=1))
+
+    print("生成完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,42 @@
 import os
+import sys
 import json
 import random
+import threading
+import itertools
+from functools import partial
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from datasets import load_dataset
 from faker import Faker
-from copy import deepcopy
 
 fake = Faker()
+fake.seed_instance(0)  # 固定词表，保证各工作进程生成的词表一致
+# 预生成词表，生成文档时绕过 Faker 的 provider 分发
+_WORDS = tuple(dict.fromkeys(fake.words(nb=512)))
+# 随机源按线程隔离，见 _rng()
+_tls = threading.local()
+
+
+def _rng():
+    """返回当前线程独享的 random.Random，多线程生成时互不争用"""
+    rng = getattr(_tls, "rng", None)
+    if rng is None:
+        rng = _tls.rng = random.Random()
+    return rng
+
+
+# 只读默认值，避免在热循环中每次调用都分配新的 dict
+_EMPTY = {}
+_DEFAULT_STRING_ITEM = {"type": "string"}
+
+# 基础类型取值函数，按 type 字符串直接查表分派，参数为随机源
+_PRIMITIVE_GEN = {
+    "string": lambda rng: rng.choice(_WORDS),
+    "integer": lambda rng: rng.randint(0, 100),
+    "number": lambda rng: rng.randrange(100000) / 100.0,
+    "boolean": lambda rng: rng.random() < 0.5,
+}
 
 # ---------- 配置 ----------
 DATASET_NAME = "epfl-dlab/JSONSchemaBench"
@@ -15,73 +46,117 @@ NUM_VERSIONS = 10  # 增加到 10 个版本，确保覆盖更多变更
 NUM_DOCS_PER_VERSION = 5  # 每个版本生成 5 个 JSON 文档
 MIN_FIELDS = 10  # 筛选字段数 >= 10 的 schema
 
-# 禁用 Hugging Face 符号链接警告
-os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "true"
+MAX_DEPTH = 8  # 生成文档时的最大嵌套深度，超出部分按缺失值处理
 
-# ---------- 加载数据集 ----------
-try:
-    ds = load_dataset(DATASET_NAME, name=SUBSET_NAME)
-    train_schemas = ds["train"]
-except Exception as e:
-    print(f"加载数据集失败: {e}")
-    exit(1)
+# 默认输出紧凑 JSON 以加快序列化；命令行传入 --pretty 时缩进输出，便于人工查看
+PRETTY_JSON = "--pretty" in sys.argv
+# 命令行传入 --debug 时打印数据集前几条样本
+DEBUG = "--debug" in sys.argv
 
-# 调试：检查数据集结构和前几行数据
-print(f"Dataset features: {train_schemas.features}")
-print(f"First 2 examples: {[train_schemas[i] for i in range(min(2, len(train_schemas)))]}")
+# 禁用 Hugging Face 符号链接警告
+os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "true"
 
 # ---------- 工具函数 ----------
+def save_json(obj, path):
+    """用 orjson 直接序列化为 UTF-8 字节，再一次性写入文件"""
+    try:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if PRETTY_JSON else 0)
+    except TypeError:  # 超出 64 位的整数等 orjson 无法序列化的值，交给标准库处理
+        if PRETTY_JSON:
+            data = json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+        else:
+            data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(data)
+
 def count_fields(schema, parent_key=""):
     """递归计算 schema 中所有字段数（包括嵌套字段）"""
     count = 0
-    props = schema.get("properties", {})
+    props = schema.get("properties", _EMPTY)
     count += len(props)
     for key, value in props.items():
         if value.get("type") == "object":
             count += count_fields(value, f"{parent_key}.{key}" if parent_key else key)
-        elif value.get("type") == "array" and value.get("items", {}).get("type") == "object":
+        elif value.get("type") == "array" and value.get("items", _EMPTY).get("type") == "object":
             count += count_fields(value["items"], f"{parent_key}.{key}[]" if parent_key else f"{key}[]")
     return count
 
-def get_array_fields(schema):
-    """获取 schema 中类型为 array 的字段"""
-    return [k for k, v in schema.get("properties", {}).items() if v.get("type") == "array"]
-
-def get_object_fields(schema):
-    """获取 schema 中类型为 object 的字段"""
-    return [k for k, v in schema.get("properties", {}).items() if v.get("type") == "object"]
-
 def generate_example(schema):
-    """根据 JSON Schema 生成随机 JSON 文档"""
-    example = {}
+    """根据 JSON Schema 生成一份随机 JSON 文档；同一 schema 要生成多份时先 compile_generator 再反复调用"""
+    return compile_generator(schema)()
+
+
+def _primitive_array(rng, item_type, n):
+    """生成长度为 n 的基础类型数组，元素批量生成"""
+    if item_type == "string":
+        return rng.choices(_WORDS, k=n)
+    if item_type == "integer":
+        return [rng.randint(0, 100) for _ in range(n)]
+    if item_type == "number":
+        return [rng.randrange(100000) / 100.0 for _ in range(n)]
+    return [rng.random() < 0.5 for _ in range(n)]  # boolean
+
+
+def compile_generator(schema, _depth=0):
+    """将 schema 预编译为文档生成函数
+
+    字段遍历和类型分派只在编译时做一次，同一版本生成多个文档时直接调用返回的函数。
+    嵌套超过 MAX_DEPTH 层的对象取值为 None。
+    """
+    if _depth > MAX_DEPTH:
+        return lambda: None
+    rng = _rng()
     required = schema.get("required", [])
-    for prop, definition in schema.get("properties", {}).items():
-        typ = definition.get("type", "string")
-        if typ == "string":
-            value = fake.word()
-        elif typ == "integer":
-            value = fake.random_int(min=0, max=100)
-        elif typ == "number":
-            value = fake.random_number(digits=5) / 100.0
-        elif typ == "boolean":
-            value = fake.boolean()
+    fields = []
+    for prop, definition in schema.get("properties", _EMPTY).items():
+        gen = _compile_field(definition, _depth)
+        if gen is not None:
+            fields.append((prop, gen))
+        elif prop in required:
+            fields.append((prop, lambda: rng.choice(_WORDS)))  # 默认值填充
+    return lambda: {prop: gen() for prop, gen in fields}
+
+
+def _compile_field(definition, _depth):
+    """为单个字段生成取值函数，未知类型返回 None"""
+    rng = _rng()
+    typ = definition.get("type", "string")
+    gen = _PRIMITIVE_GEN.get(typ) if isinstance(typ, str) else None  # 联合类型（list）不可哈希，按未知类型跳过
+    if gen is not None:
+        return partial(gen, rng)
+    if typ == "object":
+        if _depth >= MAX_DEPTH:
+            return None
+        return compile_generator(definition, _depth + 1)
+    if typ == "array":
+        items_def = definition.get("items", _DEFAULT_STRING_ITEM)
+        item_type = items_def.get("type")
+        if isinstance(item_type, str) and item_type in _PRIMITIVE_GEN:
+            return lambda: _primitive_array(rng, item_type, rng.randint(1, 3))
+        item_gen = compile_generator(items_def, _depth + 1)
+        return lambda: [item_gen() for _ in range(rng.randint(1, 3))]
+    return None
+
+
+def evolve_schema(props, required, version_num):
+    """生成演化版本的 properties 和 required，基于数据集字段动态生成变更
+
+    返回新的 properties 字典和 required 列表：未改动的字段直接复用原定义，
+    只为被修改的字段分配新 dict，因此各版本之间共享的子 schema 不会被原地修改。
+    """
+    props = dict(props)
+    required = list(required)
+    # 字段名列表和 required 集合只构建一次，各分支共用（集合用于 O(1) 成员判断）
+    field_names = list(props)
+    required_set = set(required)
+    # 一次遍历同时收集数组字段和对象字段
+    array_fields, object_fields = [], []
+    for k, v in props.items():
+        typ = v.get("type")
+        if typ == "array":
+            array_fields.append(k)
         elif typ == "object":
-            value = generate_example(definition)
-        elif typ == "array":
-            items_def = definition.get("items", {"type": "string"})
-            value = [generate_example(items_def) for _ in range(random.randint(1, 3))]
-        else:
-            value = None
-        if value is not None or prop in required:
-            example[prop] = value if value is not None else fake.word()  # 默认值填充
-    return example
-
-
-def evolve_schema(schema, version_num):
-    """生成演化版本 Schema，基于数据集字段动态生成变更"""
-    new_schema = deepcopy(schema)
-    props = new_schema.get("properties", {})
-    required = new_schema.get("required", [])
+            object_fields.append(k)
 
     # 动态选择变更类型，确保覆盖所有要求
     change_types = [
@@ -94,38 +169,38 @@ def evolve_schema(schema, version_num):
 
     if change_type == "add_field":
         # 字段新增：动态生成字段名，基于现有字段风格
-        existing_fields = list(props.keys())
+        existing_fields = field_names
         new_field = f"{random.choice(existing_fields or ['field'])}_{version_num}" if existing_fields else f"field_{version_num}"
         field_type = random.choice(["string", "integer", "boolean", "number"])
         props[new_field] = {"type": field_type, "description": f"Added field {new_field}"}
         # 50% 概率设为必填
         if random.random() > 0.5:
             required.append(new_field)
-            new_schema["required"] = required
         change_desc = f"新增字段 {new_field} (类型: {field_type}, 必填: {new_field in required})"
 
     elif change_type == "remove_field" and props:
         # 字段删除：随机选择非必填字段（优先），测试清理逻辑
-        non_required = [k for k in props.keys() if k not in required]
-        remove_field = random.choice(non_required or list(props.keys()))
+        non_required = [k for k in field_names if k not in required_set]
+        remove_field = random.choice(non_required or field_names)
         props.pop(remove_field)
-        if remove_field in required:
+        if remove_field in required_set:
             required.remove(remove_field)
         change_desc = f"删除字段 {remove_field}"
 
     elif change_type == "rename_field" and props:
         # 字段重命名：基于现有字段，添加后缀或简化
-        rename_field = random.choice(list(props.keys()))
+        rename_field = random.choice(field_names)
         new_name = f"{rename_field}_renamed_{version_num}"
-        props[new_name] = props.pop(rename_field)
-        if rename_field in required:
+        # 重建字典完成重命名，新字段名保留在原位置，便于对比版本差异
+        props = {(new_name if k == rename_field else k): v for k, v in props.items()}
+        if rename_field in required_set:
             required.remove(rename_field)
             required.append(new_name)
         change_desc = f"重命名字段 {rename_field} → {new_name}"
 
     elif change_type == "type_change" and props:
         # 字段类型转换：动态选择字段，转换为兼容类型
-        field = random.choice(list(props.keys()))
+        field = random.choice(field_names)
         old_type = props[field].get("type", "string")
         compatible_types = [t for t in ["string", "integer", "boolean", "number"] if t != old_type]
         if old_type in ["string", "integer", "number"] and random.random() > 0.5:
@@ -142,42 +217,42 @@ def evolve_schema(schema, version_num):
             change_desc = f"字段类型变更 {field}: {old_type} → object {{value: {old_type}, unit: string}}"
         elif compatible_types:
             new_type = random.choice(compatible_types)
-            props[field]["type"] = new_type
+            props[field] = {**props[field], "type": new_type}
             change_desc = f"字段类型变更 {field}: {old_type} → {new_type}"
         else:
             change_desc = f"字段类型变更 {field}: 无兼容类型，保持不变"
 
     elif change_type == "nest_field" and len(props) >= 2:
         # 简单嵌套调整：将两个字段合并为嵌套对象
-        keys = random.sample(list(props.keys()), 2)
+        keys = random.sample(field_names, 2)
         new_key = f"{keys[0]}_nested_{version_num}"
-        nested_obj = {k: props.pop(k) for k in keys}
-        props[new_key] = {"type": "object", "properties": nested_obj}
+        nested_obj = {k: props[k] for k in keys}
+        props = {k: v for k, v in props.items() if k not in nested_obj} | {
+            new_key: {"type": "object", "properties": nested_obj}
+        }
         for k in keys:
-            if k in required:
+            if k in required_set:
                 required.remove(k)
         if any(k in required for k in keys):
             required.append(new_key)
         change_desc = f"嵌套调整字段 {keys} → {new_key}"
 
-    elif change_type == "unnest_field" and any(v.get("type") == "object" for v in props.values()):
+    elif change_type == "unnest_field" and object_fields:
         # 解嵌套：将嵌套对象扁平化
-        object_fields = get_object_fields(new_schema)
         unnest_field = random.choice(object_fields)
         nested_props = props[unnest_field].get("properties", {})
         for nested_k, nested_v in nested_props.items():
             props[f"{unnest_field}_{nested_k}"] = nested_v
         props.pop(unnest_field)
-        if unnest_field in required:
+        if unnest_field in required_set:
             required.remove(unnest_field)
             for nested_k in nested_props:
                 if random.random() > 0.5:
                     required.append(f"{unnest_field}_{nested_k}")
         change_desc = f"解嵌套字段 {unnest_field}"
 
-    elif change_type == "split_array" and any(v.get("type") == "array" for v in props.values()):
+    elif change_type == "split_array" and array_fields:
         # 复杂嵌套拆分：将数组字段拆分为两个数组
-        array_fields = get_array_fields(new_schema)
         split_field = random.choice(array_fields)
         props[f"{split_field}_part1"] = {
             "type": "array",
@@ -190,94 +265,125 @@ def evolve_schema(schema, version_num):
             "description": f"Part 2 of {split_field}"
         }
         props.pop(split_field)
-        if split_field in required:
+        if split_field in required_set:
             required.remove(split_field)
             required.extend([f"{split_field}_part1", f"{split_field}_part2"])
         change_desc = f"拆分数组 {split_field} → {split_field}_part1 和 {split_field}_part2"
 
-    elif change_type == "merge_objects" and len(get_object_fields(new_schema)) >= 2:
+    elif change_type == "merge_objects" and len(object_fields) >= 2:
         # 复杂嵌套合并：将两个对象字段合并
-        object_fields = get_object_fields(new_schema)
         merge_fields = random.sample(object_fields, 2)
         merged_props = {}
         for f in merge_fields:
             merged_props.update(props[f].get("properties", {}))
             props.pop(f)
-            if f in required:
+            if f in required_set:
                 required.remove(f)
         new_key = f"merged_{merge_fields[0]}_{version_num}"
         props[new_key] = {"type": "object", "properties": merged_props}
         required.append(new_key)
         change_desc = f"合并对象 {merge_fields} → {new_key}"
 
-    new_schema["properties"] = props
-    new_schema["required"] = required
-    return new_schema, change_desc
+    return props, required, change_desc
 
 
 # ---------- 生成数据集 ----------
-# 筛选字段数 >= MIN_FIELDS 的 schema
-train_schemas_subset = [train_schemas[i] for i in range(len(train_schemas))]
-processed_count = 0
-
-for idx, example in enumerate(train_schemas_subset):
-    if processed_count >= 10:  # 限制处理 10 个复杂 schema
-        break
-
-    # 检查 example 是否为字典
-    if not isinstance(example, dict):
-        print(f"跳过示例 {idx}: 预期为字典，实际为 {type(example)}: {example}")
-        continue
-
-    # 获取 json_schema 和 unique_id
-    schema_str = example.get("json_schema")
-    unique_id = example.get("unique_id")
-    if not schema_str or not unique_id:
-        print(f"跳过示例 {idx}: 未找到 json_schema 或 unique_id")
-        continue
-
-    # 解析 JSON Schema 字符串
-    try:
-        schema = json.loads(schema_str)
-    except json.JSONDecodeError as e:
-        print(f"跳过示例 {idx}: 无效的 JSON Schema - {e}")
-        continue
-
-    # 筛选：字段数 >= MIN_FIELDS
-    if count_fields(schema) < MIN_FIELDS:
-        print(f"跳过 {unique_id}: 字段数太少 ({count_fields(schema)})")
-        continue
+def process_entity(entity):
+    """处理单个实体：逐版本演化 schema，保存 schema、JSON 文档和变更日志"""
+    unique_id, schema = entity
+    # 按 unique_id 设定随机种子，并行执行时每个实体的结果仍可复现
+    random.seed(unique_id)
+    _rng().seed(f"{unique_id}/docs")  # 文档生成用派生种子，与 schema 演化的随机序列相互独立
 
-    processed_count += 1
     entity_dir = os.path.join(OUTPUT_DIR, unique_id)  # 使用 unique_id 作为文件夹名
     os.makedirs(entity_dir, exist_ok=True)
 
     log = []
+    # 循环开始前一次性创建所有版本目录，版本循环内不再逐个检查目录
+    version_dirs = [os.path.join(entity_dir, f"v{v}") for v in range(1, NUM_VERSIONS + 1)]
+    for schema_dir in version_dirs:
+        os.makedirs(schema_dir, exist_ok=True)
+    props = schema.get("properties", {})
+    required = schema.get("required", [])
 
     for v in range(1, NUM_VERSIONS + 1):
-        # 演化 Schema
-        evolved_schema, desc = evolve_schema(schema, v)
-        schema_dir = os.path.join(entity_dir, f"v{v}")
-        os.makedirs(schema_dir, exist_ok=True)
+        # 演化 Schema：只演化 properties/required，写文件前再组装完整 Schema
+        props, required, desc = evolve_schema(props, required, v)
+        evolved_schema = {**schema, "properties": props, "required": required}
+        schema_dir = version_dirs[v - 1]
 
         # 保存 Schema
-        with open(os.path.join(schema_dir, "schema.json"), "w", encoding="utf-8") as f:
-            json.dump(evolved_schema, f, indent=2, ensure_ascii=False)
+        save_json(evolved_schema, os.path.join(schema_dir, "schema.json"))
 
-        # 生成 JSON 文档
+        # 生成 JSON 文档：每个版本只编译一次生成函数
+        generate = compile_generator(evolved_schema)
         for doc_id in range(1, NUM_DOCS_PER_VERSION + 1):
-            data = generate_example(evolved_schema)
-            with open(os.path.join(schema_dir, f"{doc_id}.json"), "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            data = generate()
+            save_json(data, os.path.join(schema_dir, f"{doc_id}.json"))
 
         # 记录变更日志
         log.append(f"v{v}: {desc}")
 
-        # 为下一版本使用当前版本 Schema
-        schema = evolved_schema
-
     # 保存日志
     with open(os.path.join(entity_dir, "change_log.txt"), "w", encoding="utf-8") as f:
         f.write("\n".join(log))
 
-print(f"生成完成！处理了 {processed_count} 个 schema")
\ No newline at end of file
+
+def main():
+    # ---------- 加载数据集 ----------
+    try:
+        ds = load_dataset(DATASET_NAME, name=SUBSET_NAME)
+        train_schemas = ds["train"]
+    except Exception as e:
+        print(f"加载数据集失败: {e}")
+        exit(1)
+
+    # 调试：检查数据集结构和前几行数据
+    print(f"Dataset features: {train_schemas.features}")
+    if DEBUG:
+        print(f"First 2 examples: {list(itertools.islice(train_schemas, 2))}")
+
+    # 筛选字段数 >= MIN_FIELDS 的 schema
+    # 直接迭代数据集并在满额后提前退出，避免把整个数据集解码成 Python 列表
+    processed_schemas = []
+
+    for idx, example in enumerate(train_schemas):
+        if len(processed_schemas) >= 10:  # 限制处理 10 个复杂 schema
+            break
+
+        # 检查 example 是否为字典
+        if not isinstance(example, dict):
+            print(f"跳过示例 {idx}: 预期为字典，实际为 {type(example)}: {example}")
+            continue
+
+        # 获取 json_schema 和 unique_id
+        schema_str = example.get("json_schema")
+        unique_id = example.get("unique_id")
+        if not schema_str or not unique_id:
+            print(f"跳过示例 {idx}: 未找到 json_schema 或 unique_id")
+            continue
+
+        # 解析 JSON Schema 字符串
+        try:
+            schema = json.loads(schema_str)
+        except json.JSONDecodeError as e:
+            print(f"跳过示例 {idx}: 无效的 JSON Schema - {e}")
+            continue
+
+        # 筛选：字段数 >= MIN_FIELDS
+        total_fields = count_fields(schema)
+        if total_fields < MIN_FIELDS:
+            print(f"跳过 {unique_id}: 字段数太少 ({total_fields})")
+            continue
+
+        processed_schemas.append((unique_id, schema))
+
+    # 各实体互不依赖，按实体分发到多进程并行生成
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(process_entity, processed_schemas, chunksize=1))
+
+    print(f"生成完成！处理了 {len(processed_schemas)} 个 schema")
+
+
+if __name__ == "__main__":
+    main()
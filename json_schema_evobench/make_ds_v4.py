@@ -1,18 +1,45 @@
 import os
 import json
 import random
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from faker import Faker
 from datasets import load_dataset, get_dataset_config_names
 
-fake = Faker()
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    orjson = None
+
+# Windows 下 os.open 默认以文本模式打开，需显式指定二进制模式，避免换行被转换
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+# 只用于在导入时生成词表，仅加载 lorem provider，省去其余 provider 和本地化数据的加载
+fake = Faker(providers=["faker.providers.lorem"])
+fake.seed_instance(0)  # 固定词表，保证各工作进程生成的词表一致
+# 预生成词表，生成文档时绕过 Faker 的 provider 分发
+_WORDS = tuple(dict.fromkeys(fake.words(nb=512)))
+
+
+def _random_number():
+    """0.00 ~ 999.99 之间两位小数的随机数"""
+    return random.randrange(100000) / 100.0
+
+
+def _random_bool():
+    return random.random() < 0.5
 
 
 class SchemaEvolver:
-    def __init__(self, output_dir="./evolved_dataset", num_versions=10, num_docs_per_version=5):
+    def __init__(self, output_dir="./evolved_dataset", num_versions=10, num_docs_per_version=5, max_workers=None,
+                 io_threads=8):
         self.output_dir = output_dir
         self.num_versions = num_versions
         self.num_docs_per_version = num_docs_per_version
+        # 并行生成的进程数，默认取 CPU 核数，为 1 时在当前进程内顺序执行
+        self.max_workers = max_workers
+        # 每个 schema 内并发写文件的线程数，为 0 时在生成线程中顺序写入
+        self.io_threads = io_threads
         os.makedirs(self.output_dir, exist_ok=True)
 
     # ---------- 工具函数 ----------
@@ -28,6 +55,48 @@ class SchemaEvolver:
                 count += SchemaEvolver.count_fields(value["items"])
         return count
 
+    @staticmethod
+    def has_at_least_fields(schema, k):
+        """判断 schema 字段总数是否不少于 k：显式栈遍历，计数达到 k 即返回"""
+        if k <= 0:
+            return True
+        count = 0
+        stack = [schema]
+        while stack:
+            node = stack.pop()
+            props = node.get("properties", {})
+            count += len(props)
+            if count >= k:
+                return True
+            for value in props.values():
+                typ = value.get("type")
+                if typ == "object":
+                    stack.append(value)
+                elif typ == "array" and value.get("items", {}).get("type") == "object":
+                    stack.append(value["items"])
+        return False
+
+    @staticmethod
+    def _dump_json(data):
+        """序列化为 UTF-8 JSON 字节，优先使用 orjson"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            except TypeError:  # 超出 64 位的整数等 orjson 无法序列化的值，交给标准库处理
+                pass
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def _write_bytes(file_path, payload):
+        """将序列化好的内容一次性写入文件：直接用 os.open/os.write，绕过缓冲 IO 层"""
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+        try:
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
     @staticmethod
     def get_array_fields(schema):
         return [k for k, v in schema.get("properties", {}).items() if v.get("type") == "array"]
@@ -37,36 +106,53 @@ class SchemaEvolver:
         return [k for k, v in schema.get("properties", {}).items() if v.get("type") == "object"]
 
     @staticmethod
-    def generate_example(schema):
-        example = {}
+    def compile_generator(schema):
+        """将 schema 编译为示例数据生成函数：只遍历一次 schema，为每个字段预先确定取值函数
+
+        同一版本需生成多个文档时编译一次、调用多次；取值顺序与逐字段解析 schema 时一致。
+        """
         required = schema.get("required", [])
+        gens = []
         for prop, definition in schema.get("properties", {}).items():
             typ = definition.get("type", "string")
             if typ == "string":
-                value = fake.word()
+                gen = partial(random.choice, _WORDS)
             elif typ == "integer":
-                value = fake.random_int(min=0, max=100)
+                gen = partial(random.randint, 0, 100)
             elif typ == "number":
-                value = fake.random_number(digits=5) / 100.0
+                gen = _random_number
             elif typ == "boolean":
-                value = fake.boolean()
+                gen = _random_bool
             elif typ == "object":
-                value = SchemaEvolver.generate_example(definition)
+                gen = SchemaEvolver.compile_generator(definition)
             elif typ == "array":
-                items_def = definition.get("items", {"type": "string"})
-                value = [SchemaEvolver.generate_example(items_def) for _ in range(random.randint(1, 3))]
+                def gen(items_gen=SchemaEvolver.compile_generator(definition.get("items", {"type": "string"}))):
+                    return [items_gen() for _ in range(random.randint(1, 3))]
+            elif prop in required:
+                # 无法识别的类型：必需字段用随机单词补齐，非必需字段不输出
+                gen = partial(random.choice, _WORDS)
             else:
-                value = None
-            if value is not None or prop in required:
-                example[prop] = value if value is not None else fake.word()
-        return example
+                continue
+            gens.append((prop, gen))
+
+        def generate():
+            return {prop: gen() for prop, gen in gens}
+
+        return generate
+
+    @staticmethod
+    def generate_example(schema):
+        return SchemaEvolver.compile_generator(schema)()
 
     @staticmethod
     def evolve_schema(schema, version_num):
-        """保留原始演化逻辑"""
-        new_schema = deepcopy(schema)
-        props = new_schema.get("properties", {})
-        required = new_schema.get("required", [])
+        """保留原始演化逻辑
+
+        新版本与上一版本结构共享：未被修改的 properties、required 容器和所有字段定义直接沿用，
+        只在发生变更的分支中构造新的容器，不修改输入 schema。
+        """
+        props = schema.get("properties", {})
+        required = schema.get("required", [])
 
         change_types = [
             "add_field", "remove_field", "rename_field", "type_change",
@@ -79,32 +165,37 @@ class SchemaEvolver:
             existing_fields = list(props.keys())
             new_field = f"{random.choice(existing_fields or ['field'])}_{version_num}"
             field_type = random.choice(["string", "integer", "boolean", "number"])
-            props[new_field] = {"type": field_type}
+            props = {**props, new_field: {"type": field_type}}
             if random.random() > 0.5:
-                required.append(new_field)
+                required = required + [new_field]
             change_desc = f"新增字段 {new_field} (类型: {field_type})"
 
         elif change_type == "remove_field" and props:
-            non_required = [k for k in props.keys() if k not in required]
+            # 先转为集合再做成员判断，避免逐字段线性扫描 required 列表
+            required_set = set(required)
+            non_required = [k for k in props.keys() if k not in required_set]
             remove_field = random.choice(non_required or list(props.keys()))
-            props.pop(remove_field)
-            if remove_field in required:
+            props = {k: v for k, v in props.items() if k != remove_field}
+            if remove_field in required_set:
+                required = list(required)
                 required.remove(remove_field)
             change_desc = f"删除字段 {remove_field}"
 
         elif change_type == "rename_field" and props:
             rename_field = random.choice(list(props.keys()))
             new_name = f"{rename_field}_renamed_{version_num}"
-            props[new_name] = props.pop(rename_field)
+            field_def = props[rename_field]
+            props = {k: v for k, v in props.items() if k != rename_field}
+            props[new_name] = field_def
             if rename_field in required:
+                required = list(required)
                 required.remove(rename_field)
                 required.append(new_name)
             change_desc = f"重命名字段 {rename_field} → {new_name}"
 
         # 可继续保留其他演化策略...
 
-        new_schema["properties"] = props
-        new_schema["required"] = required
+        new_schema = {**schema, "properties": props, "required": required}
         return new_schema, change_desc
 
     # ---------- 核心处理函数 ----------
@@ -120,7 +211,8 @@ class SchemaEvolver:
         processed_schemas = []
         for subset in subsets:
             try:
-                ds = load_dataset(dataset_name, name=subset)
+                # 流式读取：只拉取实际遍历到的行，取满 max_schemas_per_subset 个后即停止
+                ds = load_dataset(dataset_name, name=subset, streaming=True)
                 train_schemas = ds["train"]
             except Exception as e:
                 print(f"加载子集 {subset} 失败: {e}")
@@ -140,7 +232,7 @@ class SchemaEvolver:
                 except json.JSONDecodeError:
                     continue
 
-                if self.count_fields(schema) < min_fields:
+                if not self.has_at_least_fields(schema, min_fields):
                     continue
 
                 subset_processed_count += 1
@@ -174,31 +266,68 @@ class SchemaEvolver:
 
     # ---------- 内部生成函数 ----------
     def _generate_dataset(self, processed_schemas):
-        for subset, unique_id, schema in processed_schemas:
-            entity_dir = os.path.join(self.output_dir, subset, unique_id)
-            os.makedirs(entity_dir, exist_ok=True)
+        # 各 schema 的演化与数据生成相互独立，按进程并行
+        if self.max_workers == 1 or len(processed_schemas) <= 1:
+            for entity in processed_schemas:
+                self._generate_entity(entity)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(self._generate_entity, processed_schemas))
 
-            log = []
+        print(f"生成完成！总计处理了 {len(processed_schemas)} 个 schema")
+
+    def _generate_entity(self, entity):
+        """为单个 (subset, unique_id, schema) 生成全部版本和示例数据，作为进程池任务执行"""
+        subset, unique_id, schema = entity
+        # 按子集和 unique_id 设定随机种子，并行执行时每个 schema 的结果仍可复现
+        random.seed(f"{subset}/{unique_id}")
+
+        entity_dir = os.path.join(self.output_dir, subset, unique_id)
+        os.makedirs(entity_dir, exist_ok=True)
+        # 一次性创建所有版本目录，版本循环中不再检查目录；输出路径直接用 f-string 拼接
+        version_dirs = [f"{entity_dir}/v{v}" for v in range(1, self.num_versions + 1)]
+        for schema_dir in version_dirs:
+            try:
+                os.mkdir(schema_dir)
+            except FileExistsError:
+                pass
+
+        log = []
+        generate = compiled_props = compiled_required = None
+        # 写文件线程池随 entity 创建和关闭，避免进程池 fork 时继承线程
+        pool = ThreadPoolExecutor(max_workers=self.io_threads) if self.io_threads > 0 else None
+        try:
             for v in range(1, self.num_versions + 1):
                 evolved_schema, desc = self.evolve_schema(schema, v)
-                schema_dir = os.path.join(entity_dir, f"v{v}")
-                os.makedirs(schema_dir, exist_ok=True)
-
-                with open(os.path.join(schema_dir, "schema.json"), "w", encoding="utf-8") as f:
-                    json.dump(evolved_schema, f, indent=2, ensure_ascii=False)
-
+                schema_dir = version_dirs[v - 1]
+
+                # 先序列化本版本的 schema 和全部文档，再统一写入
+                writes = [(f"{schema_dir}/schema.json", self._dump_json(evolved_schema))]
+                # 生成函数只取决于 properties 和 required；无变更的版本与上一版本共享这两个容器，直接复用已编译的函数
+                props, required = evolved_schema["properties"], evolved_schema["required"]
+                if generate is None or props is not compiled_props or required is not compiled_required:
+                    generate = self.compile_generator(evolved_schema)
+                    compiled_props, compiled_required = props, required
                 for doc_id in range(1, self.num_docs_per_version + 1):
-                    data = self.generate_example(evolved_schema)
-                    with open(os.path.join(schema_dir, f"{doc_id}.json"), "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
+                    writes.append((f"{schema_dir}/{doc_id}.json", self._dump_json(generate())))
+
+                if pool is None:
+                    for file_path, payload in writes:
+                        self._write_bytes(file_path, payload)
+                else:
+                    # 等待本版本写完再进入下一版本，写入中的异常在这里抛出
+                    for future in [pool.submit(self._write_bytes, *item) for item in writes]:
+                        future.result()
 
                 log.append(f"v{v}: {desc}")
                 schema = evolved_schema
+        finally:
+            if pool is not None:
+                pool.shutdown()
 
-            with open(os.path.join(entity_dir, "change_log.txt"), "w", encoding="utf-8") as f:
-                f.write("\n".join(log))
-
-        print(f"生成完成！总计处理了 {len(processed_schemas)} 个 schema")
+        with open(os.path.join(entity_dir, "change_log.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(log))
+        return log
 
 
 # ---------- 示例用法 ----------
@@ -1,12 +1,59 @@
+import io
 import os
 import json
+import time
 import random
-from copy import deepcopy
+import tarfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from faker import Faker
 from datasets import load_dataset, get_dataset_config_names
 from typing import Dict, List, Tuple, Optional, Union
 
-fake = Faker()
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    orjson = None
+
+# Faker 和词表都在首次使用时才创建，只导入本模块时不必加载 Faker 的全部 provider
+_fake: Optional[Faker] = None
+_words: Optional[Tuple[str, ...]] = None
+
+
+def _get_fake() -> Faker:
+    """返回模块共享的 Faker 实例，首次调用时创建"""
+    global _fake
+    if _fake is None:
+        _fake = Faker()
+        _fake.seed_instance(0)  # 固定词表，保证各工作进程生成的词表一致
+    return _fake
+
+
+def _get_words() -> Tuple[str, ...]:
+    """返回预生成词表，生成示例数据时直接从中抽取，绕过 Faker 的 provider 分发"""
+    global _words
+    if _words is None:
+        _words = tuple(dict.fromkeys(_get_fake().words(nb=10000)))
+    return _words
+
+# 生成计划中的字段类型编码
+_UNKNOWN, _STRING, _INTEGER, _NUMBER, _BOOLEAN, _OBJECT, _ARRAY = range(-1, 6)
+_TYPE_CODES = {"string": _STRING, "integer": _INTEGER, "number": _NUMBER, "boolean": _BOOLEAN,
+               "object": _OBJECT, "array": _ARRAY}
+
+
+def _loads_json(text: str):
+    """解析 JSON 字符串：优先 orjson，解析失败时再交给标准库（兼容 NaN 等扩展写法）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def _copy_top_level(schema: Dict) -> Dict:
+    """浅拷贝 schema，只为会被修改的 properties 和 required 分配新容器，其余子 schema 按引用共享"""
+    return {**schema, "properties": dict(schema.get("properties", {})), "required": list(schema.get("required", []))}
 
 
 class SchemaUtils:
@@ -14,15 +61,18 @@ class SchemaUtils:
 
     @staticmethod
     def count_fields(schema: Dict) -> int:
-        """递归计算 schema 中的字段总数"""
+        """计算 schema 中的字段总数（含嵌套字段），用显式栈代替递归"""
         count = 0
-        props = schema.get("properties", {})
-        count += len(props)
-        for key, value in props.items():
-            if value.get("type") == "object":
-                count += SchemaUtils.count_fields(value)
-            elif value.get("type") == "array" and value.get("items", {}).get("type") == "object":
-                count += SchemaUtils.count_fields(value["items"])
+        stack = [schema]
+        while stack:
+            props = stack.pop().get("properties", {})
+            count += len(props)
+            for value in props.values():
+                typ = value.get("type")
+                if typ == "object":
+                    stack.append(value)
+                elif typ == "array" and value.get("items", {}).get("type") == "object":
+                    stack.append(value["items"])
         return count
 
     @staticmethod
@@ -36,142 +86,264 @@ class SchemaUtils:
         return [k for k, v in schema.get("properties", {}).items() if v.get("type") == "object"]
 
     @staticmethod
-    def generate_example(schema: Dict) -> Dict:
-        """根据 schema 生成示例数据"""
+    def compile_plan(schema: Dict) -> List[Tuple[str, int, bool, Optional[List[Tuple]]]]:
+        """将 schema 编译为扁平的生成计划
+
+        每个字段对应一个 (字段名, 类型编码, 是否必需, 子计划) 元组，对象和数组的子计划为嵌套的计划列表，
+        同一版本生成多个文档时只需解析一次 schema。
+        """
+        root = []
+        # 用显式栈展开嵌套：栈中每项为 (子 schema, 待填充的子计划)
+        stack = [(schema, root)]
+        while stack:
+            node, plan = stack.pop()
+            required = node.get("required", [])
+            # draft-3 的 "required": true 写在属性自身上，不是字段名列表，这里按无必需字段处理
+            if not isinstance(required, list):
+                required = ()
+            for prop, definition in node.get("properties", {}).items():
+                typ = definition.get("type", "string")
+                # type 可能是 ["string", "null"] 这样的列表，按未知类型处理
+                code = _TYPE_CODES.get(typ, _UNKNOWN) if isinstance(typ, str) else _UNKNOWN
+                child = None
+                if code == _OBJECT:
+                    child = []
+                    stack.append((definition, child))
+                elif code == _ARRAY:
+                    child = []
+                    stack.append((definition.get("items", {"type": "string"}), child))
+                # 是否必需只对未知类型有用（用默认值填充）；只在这时才判断，
+                # 以免 draft-3 写法 "required": true 这类非列表值在其他字段上触发 TypeError
+                plan.append((prop, code, code == _UNKNOWN and prop in required, child))
+        return root
+
+    @staticmethod
+    def generate_from_plan(plan: List[Tuple]) -> Dict:
+        """按 compile_plan 生成的计划生成示例数据
+
+        取值都由 rand() 缩放得到，避免 randint/choice 在 Python 层的多级调用。
+        嵌套的对象和数组元素用显式栈按深度优先顺序填充，不再逐层递归调用，
+        栈中每项为 (剩余字段迭代器, 待填充的 dict)。
+        """
+        words = _get_words()
+        num_words = len(words)
+        rand = random.random  # 热循环中使用局部变量，省去每次的全局和属性查找
         example = {}
-        required = schema.get("required", [])
-        for prop, definition in schema.get("properties", {}).items():
-            typ = definition.get("type", "string")
-            value = None
-            if typ == "string":
-                value = fake.word()
-            elif typ == "integer":
-                value = fake.random_int(min=0, max=100)
-            elif typ == "number":
-                value = fake.random_number(digits=5) / 100.0
-            elif typ == "boolean":
-                value = fake.boolean()
-            elif typ == "object":
-                value = SchemaUtils.generate_example(definition)
-            elif typ == "array":
-                items_def = definition.get("items", {"type": "string"})
-                value = [SchemaUtils.generate_example(items_def) for _ in range(random.randint(1, 3))]
-            if value is not None or prop in required:
-                example[prop] = value if value is not None else fake.word()
+        stack = [(iter(plan), example)]
+        while stack:
+            fields, out = stack[-1]
+            for prop, code, is_required, child in fields:
+                if code == _STRING:
+                    out[prop] = words[int(rand() * num_words)]
+                elif code == _INTEGER:
+                    out[prop] = int(rand() * 101)
+                elif code == _NUMBER:
+                    out[prop] = int(rand() * 100000) / 100.0
+                elif code == _BOOLEAN:
+                    out[prop] = rand() < 0.5
+                elif code == _OBJECT:
+                    value = out[prop] = {}
+                    stack.append((iter(child), value))
+                    break
+                elif code == _ARRAY:
+                    items = out[prop] = [{} for _ in range(1 + int(rand() * 3))]
+                    # 逆序入栈，使第一个元素最先出栈填充
+                    stack += [(iter(child), item) for item in reversed(items)]
+                    break
+                elif is_required:
+                    out[prop] = words[int(rand() * num_words)]
+            else:
+                stack.pop()
         return example
 
+    @staticmethod
+    def generate_example(schema: Dict) -> Dict:
+        """根据 schema 生成示例数据"""
+        return SchemaUtils.generate_from_plan(SchemaUtils.compile_plan(schema))
+
 
 class SchemaEvolutionStrategy:
-    """定义 schema 演化策略"""
+    """定义 schema 演化策略
+
+    各策略只复制顶层的 properties 和 required，嵌套子 schema 与上一版本共享，调用方不得原地修改。
+    """
 
     @staticmethod
     def add_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """添加新字段"""
-        new_schema = deepcopy(schema)
-        props = new_schema.get("properties", {})
-        required = new_schema.get("required", [])
+        new_schema = _copy_top_level(schema)
+        props = new_schema["properties"]
+        required = new_schema["required"]
         existing_fields = list(props.keys())
         new_field = f"{random.choice(existing_fields or ['field'])}_{version_num}"
         field_type = random.choice(["string", "integer", "boolean", "number"])
         props[new_field] = {"type": field_type}
         if random.random() > 0.5:
             required.append(new_field)
-        new_schema["properties"] = props
-        new_schema["required"] = required
         return new_schema, f"新增字段 {new_field} (类型: {field_type})"
 
     @staticmethod
     def remove_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """删除字段（优先选择非必需字段）"""
-        new_schema = deepcopy(schema)
-        props = new_schema.get("properties", {})
-        required = new_schema.get("required", [])
-        if not props:
-            return new_schema, "无变更（无字段可删除）"
-        non_required = [k for k in props.keys() if k not in required]
+        if not schema.get("properties"):
+            return dict(schema), "无变更（无字段可删除）"
+        new_schema = _copy_top_level(schema)
+        props = new_schema["properties"]
+        required = new_schema["required"]
+        required_set = set(required)
+        non_required = [k for k in props if k not in required_set]
         remove_field = random.choice(non_required or list(props.keys()))
         props.pop(remove_field)
-        if remove_field in required:
+        if remove_field in required_set:
             required.remove(remove_field)
-        new_schema["properties"] = props
-        new_schema["required"] = required
         return new_schema, f"删除字段 {remove_field}"
 
     @staticmethod
     def rename_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """重命名字段"""
-        new_schema = deepcopy(schema)
-        props = new_schema.get("properties", {})
-        required = new_schema.get("required", [])
-        if not props:
-            return new_schema, "无变更（无字段可重命名）"
+        if not schema.get("properties"):
+            return dict(schema), "无变更（无字段可重命名）"
+        new_schema = _copy_top_level(schema)
+        props = new_schema["properties"]
+        required = new_schema["required"]
         rename_field = random.choice(list(props.keys()))
         new_name = f"{rename_field}_renamed_{version_num}"
         props[new_name] = props.pop(rename_field)
         if rename_field in required:
             required.remove(rename_field)
             required.append(new_name)
-        new_schema["properties"] = props
-        new_schema["required"] = required
         return new_schema, f"重命名字段 {rename_field} → {new_name}"
 
     @staticmethod
     def evolve_schema(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """根据版本号选择演化策略"""
-        strategies = [
-            SchemaEvolutionStrategy.add_field,
-            SchemaEvolutionStrategy.remove_field,
-            SchemaEvolutionStrategy.rename_field,
-            # 可扩展其他策略：type_change, nest_field, unnest_field, split_array, merge_objects
-        ]
-        strategy = strategies[(version_num - 1) % len(strategies)]
-        return strategy(schema, version_num)
+        return _STRATEGIES[(version_num - 1) % len(_STRATEGIES)](schema, version_num)
+
+
+# 按版本号轮换的演化策略，在模块加载时构造一次，evolve_schema 中直接按下标调用
+_STRATEGIES = (
+    SchemaEvolutionStrategy.add_field,
+    SchemaEvolutionStrategy.remove_field,
+    SchemaEvolutionStrategy.rename_field,
+    # 可扩展其他策略：type_change, nest_field, unnest_field, split_array, merge_objects
+)
 
 
 class SchemaEvolver:
     """主类：管理 JSON Schema 的演化与数据生成"""
 
-    def __init__(self, output_dir: str = "./evolved_dataset", num_versions: int = 10, num_docs_per_version: int = 5):
-        """初始化演化器"""
+    def __init__(self, output_dir: str = "./evolved_dataset", num_versions: int = 10, num_docs_per_version: int = 5,
+                 archive: bool = False, max_workers: Optional[int] = None, io_threads: int = 0):
+        """初始化演化器
+
+        archive 为 True 时，每个 schema 的全部输出写入 <output_dir>/<subset>/<unique_id>.tar，
+        归档内保持 v1/schema.json、v1/1.json、change_log.txt 的目录结构，避免产生大量小文件。
+        max_workers 为并行生成的进程数，默认取 CPU 核数，为 1 时在当前进程内顺序执行。
+        io_threads 大于 0 时，非归档模式下的文件写入交给该数量的线程并发执行，适合每个版本文档数较多的场景。
+        """
         self.output_dir = output_dir
         self.num_versions = num_versions
         self.num_docs_per_version = num_docs_per_version
+        self.archive = archive
+        self.max_workers = max_workers
+        self.io_threads = io_threads
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def _save_json_file(self, data: Dict, file_path: str) -> None:
-        """保存 JSON 数据到文件"""
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    @staticmethod
+    def _dump_json(data: Dict) -> bytes:
+        """序列化为 UTF-8 JSON 字节，优先使用 orjson"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            except TypeError:  # 超出 64 位的整数等 orjson 无法序列化的值，交给标准库处理
+                pass
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def _write_bytes(file_path: str, payload: bytes) -> None:
+        """将序列化好的内容一次性写入文件"""
+        with open(file_path, "wb") as f:
+            f.write(payload)
+
+    @staticmethod
+    def _add_to_archive(tar: tarfile.TarFile, name: str, payload: bytes) -> None:
+        """将内存中的内容作为归档成员 name 写入 tar"""
+        info = tarfile.TarInfo(name)
+        info.size = len(payload)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(payload))
+
+    def _emit(self, tar: Optional[tarfile.TarFile], entity_dir: str, name: str, payload: bytes,
+              pool: Optional[ThreadPoolExecutor] = None, pending: Optional[List[Future]] = None) -> None:
+        """输出 entity 内相对路径为 name 的文件：写入归档或 entity_dir 下的同名文件
+
+        每个文件都会调用一次，直接用 f-string 拼接路径，省去 os.path.join 的开销（Windows 同样接受 /）。
+        传入 pool 时写文件提交到线程池，返回的 Future 记入 pending，由调用方统一等待。
+        """
+        if tar is not None:
+            self._add_to_archive(tar, name, payload)
+        elif pool is None:
+            self._write_bytes(f"{entity_dir}/{name}", payload)
+        else:
+            pending.append(pool.submit(self._write_bytes, f"{entity_dir}/{name}", payload))
 
     def _generate_version(self, schema: Dict, subset: str, unique_id: str) -> List[str]:
         """为单个 schema 生成多个版本和示例数据"""
         current_schema = schema
         log = []
         entity_dir = os.path.join(self.output_dir, subset, unique_id)
-        os.makedirs(entity_dir, exist_ok=True)
-
-        for v in range(1, self.num_versions + 1):
-            # 演化 schema
-            evolved_schema, desc = SchemaEvolutionStrategy.evolve_schema(current_schema, v)
-            schema_dir = os.path.join(entity_dir, f"v{v}")
-            os.makedirs(schema_dir, exist_ok=True)
-
-            # 保存 schema
-            self._save_json_file(evolved_schema, os.path.join(schema_dir, "schema.json"))
-
-            # 生成并保存示例数据
-            for doc_id in range(1, self.num_docs_per_version + 1):
-                data = SchemaUtils.generate_example(evolved_schema)
-                self._save_json_file(data, os.path.join(schema_dir, f"{doc_id}.json"))
-
-            log.append(f"v{v}: {desc}")
-            current_schema = evolved_schema
+        if self.archive:
+            os.makedirs(os.path.dirname(entity_dir), exist_ok=True)
+            tar = tarfile.open(f"{entity_dir}.tar", "w")
+        else:
+            # 一次性创建所有版本目录，版本循环中不再调用 makedirs
+            os.makedirs(entity_dir, exist_ok=True)
+            for v in range(1, self.num_versions + 1):
+                os.makedirs(os.path.join(entity_dir, f"v{v}"), exist_ok=True)
+            tar = None
+        # tar 只能顺序写入，线程池仅用于非归档模式；每个 entity 单独创建，避免进程池 fork 时继承线程
+        pool = ThreadPoolExecutor(max_workers=self.io_threads) if self.io_threads > 0 and tar is None else None
+        pending = []
 
-        # 保存变更日志
-        with open(os.path.join(entity_dir, "change_log.txt"), "w", encoding="utf-8") as f:
-            f.write("\n".join(log))
+        try:
+            for v in range(1, self.num_versions + 1):
+                # 演化 schema
+                evolved_schema, desc = SchemaEvolutionStrategy.evolve_schema(current_schema, v)
+
+                # 保存 schema：只序列化一次，得到的字节直接写入文件或归档
+                schema_bytes = self._dump_json(evolved_schema)
+                self._emit(tar, entity_dir, f"v{v}/schema.json", schema_bytes, pool, pending)
+
+                # 生成并保存示例数据：每个版本只编译一次生成计划
+                plan = SchemaUtils.compile_plan(evolved_schema)
+                for doc_id in range(1, self.num_docs_per_version + 1):
+                    data = SchemaUtils.generate_from_plan(plan)
+                    self._emit(tar, entity_dir, f"v{v}/{doc_id}.json", self._dump_json(data), pool, pending)
+
+                log.append(f"v{v}: {desc}")
+                current_schema = evolved_schema
+
+            # 保存变更日志
+            self._emit(tar, entity_dir, "change_log.txt", "\n".join(log).encode("utf-8"), pool, pending)
+
+            # 等待所有写入完成，写入中的异常在这里抛出
+            for future in pending:
+                future.result()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if tar is not None:
+                tar.close()
         return log
 
+    def _generate_entity(self, entity: Tuple[str, str, Dict]) -> List[str]:
+        """处理单个 (subset, unique_id, schema)，作为进程池任务执行"""
+        subset, unique_id, schema = entity
+        # 按子集和 unique_id 设定随机种子，并行执行时每个 schema 的结果仍可复现
+        seed = f"{subset}/{unique_id}"
+        random.seed(seed)
+        return self._generate_version(schema, subset, unique_id)
+
     def _process_hf_dataset(self, dataset_name: str, max_schemas_per_subset: int = 5, min_fields: int = 5) -> List[
         Tuple[str, str, Dict]]:
         """处理 Hugging Face 数据集"""
@@ -187,7 +359,8 @@ class SchemaEvolver:
 
         for subset in subsets:
             try:
-                ds = load_dataset(dataset_name, name=subset)
+                # 流式读取：只拉取实际遍历到的行，取满 max_schemas_per_subset 个后即停止
+                ds = load_dataset(dataset_name, name=subset, streaming=True)
                 train_schemas = ds["train"]
             except Exception as e:
                 print(f"加载子集 {subset} 失败: {e}")
@@ -200,11 +373,18 @@ class SchemaEvolver:
 
                 schema_str = example.get("json_schema")
                 unique_id = example.get("unique_id")
-                if not schema_str or not unique_id:
+                # 解析前先做廉价的类型检查：只有非空字符串 ID 和以 { 开头的字符串才可能是对象 schema
+                if not unique_id or not isinstance(unique_id, str):
+                    continue
+                if not isinstance(schema_str, str) or not schema_str.lstrip().startswith("{"):
+                    continue
+
+                # 每个字段都是 JSON 中的一个键，键后必有冒号，冒号数不足 min_fields 的 schema 无需解析即可跳过
+                if schema_str.count(":") < min_fields:
                     continue
 
                 try:
-                    schema = json.loads(schema_str)
+                    schema = _loads_json(schema_str)
                 except json.JSONDecodeError:
                     continue
 
@@ -232,9 +412,13 @@ class SchemaEvolver:
         else:
             processed_schemas = self._process_hf_dataset(source, **kwargs)
 
-        # 生成演化版本和数据
-        for subset, unique_id, schema in processed_schemas:
-            self._generate_version(schema, subset, unique_id)
+        # 生成演化版本和数据：各 schema 相互独立，按进程并行
+        if self.max_workers == 1 or len(processed_schemas) <= 1:
+            for entity in processed_schemas:
+                self._generate_entity(entity)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(self._generate_entity, processed_schemas))
 
         print(f"生成完成！总计处理了 {len(processed_schemas)} 个 schema")
         return processed_schemas
@@ -1,12 +1,179 @@
 import os
 import json
 import random
-from copy import deepcopy
+import itertools
+import math
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
 from faker import Faker
 from datasets import load_dataset, get_dataset_config_names
-from typing import Dict, List, Tuple, Optional, Union
+from typing import Callable, Dict, List, Set, Tuple, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    orjson = None
+
+# Windows 下 os.open 默认以文本模式打开，需显式指定二进制模式，避免换行被转换
+_O_BINARY = getattr(os, "O_BINARY", 0)
 
 fake = Faker()
+fake.seed_instance(0)  # 固定取值池，保证各工作进程生成的取值池一致
+
+# 预生成的取值池：生成示例数据时从中随机抽取，避免逐字段调用 Faker 的 provider 分发
+_POOL_SIZE = 4096
+_WORD_POOL = tuple(fake.word() for _ in range(_POOL_SIZE))
+_EMAIL_POOL = tuple(fake.email() for _ in range(_POOL_SIZE))
+_ISO8601_POOL = tuple(fake.iso8601() for _ in range(_POOL_SIZE))
+_URI_POOL = tuple(fake.uri() for _ in range(_POOL_SIZE))
+
+# 演化操作中随机选取的候选项，模块级常量，避免每次调用重新构造列表
+_FIELD_TYPES = ("string", "integer", "number", "boolean", "object", "array")
+_BASE_NAMES = ("field", "property", "attr", "item", "running_case")
+_FORMATS = ("email", "date-time", "uri", "hostname", None)
+_ITEM_TYPES = ("string", "integer", "number", "boolean", "object")
+_ARRAY_OPS = (
+    ("change_item_type", "修改数组项类型"),
+    ("add_min_max_items", "添加最小/最大项数限制"),
+    ("make_unique_items", "要求数组项唯一"),
+)
+_ENUM_OPS = ("add_option", "remove_option", "replace_all")
+_MIN_MAX_CHOICES = ("minimum", "maximum", "both")
+_PATTERNS = (
+    "^[A-Za-z]+$",  # 只允许字母
+    "^[0-9]+$",  # 只允许数字
+    "^[A-Za-z0-9]+$",  # 字母数字
+    "^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}$",  # 电子邮件
+    "^(https?|ftp)://[^\\s/$.?#].[^\\s]*$",  # URL
+)
+_CONDITION_VALUES = ("true", "false", "yes", "no", "required", "optional")
+
+# 字符串 format 对应的取值池，未列出的 format 使用单词池
+_FORMAT_POOLS = {"email": _EMAIL_POOL, "date-time": _ISO8601_POOL, "uri": _URI_POOL}
+
+# 生成函数返回该标记时表示此字段不输出
+_OMIT = object()
+
+
+def _sample_keys(mapping: Dict, k: int) -> List[str]:
+    """从 mapping 的键中等概率无放回抽取 k 个（Algorithm L 蓄水池抽样），不构造全部键的列表
+
+    键数不足 k 时返回全部键。结果顺序随机打乱，与 random.sample 的分布相同。
+    """
+    it = iter(mapping)
+    reservoir = list(itertools.islice(it, k))
+    if len(reservoir) == k:
+        w = math.exp(math.log(1.0 - random.random()) / k)
+        while True:
+            # 跳过的元素个数服从几何分布，用 islice 在 C 层面跳过
+            skip = int(math.log(1.0 - random.random()) / math.log(1.0 - w))
+            item = next(itertools.islice(it, skip, None), _OMIT)
+            if item is _OMIT:
+                break
+            reservoir[random.randrange(k)] = item
+            w *= math.exp(math.log(1.0 - random.random()) / k)
+    random.shuffle(reservoir)
+    return reservoir
+
+
+def _prefetch(iterable, maxsize: int = 4):
+    """在后台线程中提前读取 iterable，最多缓冲 maxsize 个元素，使下一行的读取与当前行的处理重叠
+
+    读取中的异常在消费方所在线程重新抛出；消费方提前停止迭代时通知后台线程退出。
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    end = object()  # 结束标记
+
+    def put(item) -> bool:
+        # 带超时地放入，消费方停止后不会永久阻塞在已满的队列上
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((end, e))
+            return
+        put((end, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def _loads_json(text: str):
+    """解析 JSON 字符串：优先 orjson，解析失败时再交给标准库（兼容 NaN 等扩展写法）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def _copy_schema(schema: Dict) -> Dict:
+    """写时复制：只复制 schema 顶层以及已有的 properties、required 容器，嵌套子 schema 按引用共享
+
+    演化操作若要修改某个字段定义或嵌套对象，需先复制该字段定义再修改，不得原地修改输入 schema 中的任何容器。
+    """
+    new_schema = dict(schema)
+    if "properties" in new_schema:
+        new_schema["properties"] = dict(new_schema["properties"])
+    if "required" in new_schema:
+        new_schema["required"] = list(new_schema["required"])
+    return new_schema
+
+
+def _pick_key(mapping: Dict) -> str:
+    """等概率随机选取 mapping 中的一个键，不必为取一个键构造全部键的列表
+
+    与 random.choice(list(mapping)) 消耗相同的随机数，结果一致。
+    """
+    return next(itertools.islice(iter(mapping), random.randrange(len(mapping)), None))
+
+
+@lru_cache(maxsize=256)
+def _alias_table(weights: Tuple[int, ...]) -> Tuple[List[float], List[int]]:
+    """按 Walker/Vose 别名法为给定权重构建采样表，之后每次加权采样都是 O(1)
+
+    权重只取决于哪些操作已执行过，按权重元组缓存，同一组权重只构建一次。
+    """
+    n = len(weights)
+    total = sum(weights)
+    prob = [w * n / total for w in weights]
+    alias = list(range(n))
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] += prob[s] - 1.0
+        (small if prob[l] < 1.0 else large).append(l)
+    # 剩余项只差浮点误差，概率记为 1
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
 
 
 class SchemaUtils:
@@ -14,17 +181,42 @@ class SchemaUtils:
 
     @staticmethod
     def count_fields(schema: Dict) -> int:
-        """递归计算 schema 中的字段总数"""
+        """计算 schema 中的字段总数（显式栈迭代遍历，避免深层嵌套时递归溢出）"""
         count = 0
-        props = schema.get("properties", {})
-        count += len(props)
-        for key, value in props.items():
-            if value.get("type") == "object":
-                count += SchemaUtils.count_fields(value)
-            elif value.get("type") == "array" and value.get("items", {}).get("type") == "object":
-                count += SchemaUtils.count_fields(value["items"])
+        stack = deque([schema])
+        while stack:
+            node = stack.pop()
+            props = node.get("properties", {})
+            count += len(props)
+            for value in props.values():
+                typ = value.get("type")
+                if typ == "object":
+                    stack.append(value)
+                elif typ == "array" and value.get("items", {}).get("type") == "object":
+                    stack.append(value["items"])
         return count
 
+    @staticmethod
+    def has_at_least_fields(schema: Dict, k: int) -> bool:
+        """判断 schema 字段总数是否不少于 k，计数达到 k 即返回，不必遍历整个 schema"""
+        if k <= 0:
+            return True
+        count = 0
+        stack = [schema]
+        while stack:
+            node = stack.pop()
+            props = node.get("properties", {})
+            count += len(props)
+            if count >= k:
+                return True
+            for value in props.values():
+                typ = value.get("type")
+                if typ == "object":
+                    stack.append(value)
+                elif typ == "array" and value.get("items", {}).get("type") == "object":
+                    stack.append(value["items"])
+        return False
+
     @staticmethod
     def get_array_fields(schema: Dict) -> List[str]:
         """获取 schema 中的数组字段名"""
@@ -36,201 +228,274 @@ class SchemaUtils:
         return [k for k, v in schema.get("properties", {}).items() if v.get("type") == "object"]
 
     @staticmethod
-    def generate_example(schema: Dict) -> Dict:
-        """根据 schema 生成示例数据"""
-        example = {}
+    def compile_generator(schema: Dict) -> Callable[[], Dict]:
+        """将 schema 编译为示例数据生成函数：遍历一次 schema，为每个字段预先构造取值闭包
+
+        同一版本的 schema 需生成多个文档时只编译一次，之后每次调用不再重复解析字段定义。
+        字段顺序与随机数的消耗顺序和逐字段解析 schema 时一致，相同种子下生成结果相同。
+        """
+        choice = random.choice
         required = schema.get("required", [])
+        # draft-3 的 "required": true 写在属性自身上，不是字段名列表，这里按无必需字段处理
+        if not isinstance(required, list):
+            required = ()
+        gens = []
         for prop, definition in schema.get("properties", {}).items():
             typ = definition.get("type", "string")
-            value = None
+            is_required = prop in required
 
             # 处理枚举类型
             if "enum" in definition:
-                value = random.choice(definition["enum"])
+                enum = definition["enum"]
+                if None not in enum:
+                    gen = partial(choice, enum)
+                else:
+                    # 枚举取到 None 时：必需字段用随机单词补齐，非必需字段不输出
+                    fallback = partial(choice, _WORD_POOL) if is_required else None
+
+                    def gen(enum=enum, fallback=fallback):
+                        value = choice(enum)
+                        if value is not None:
+                            return value
+                        return fallback() if fallback is not None else _OMIT
             elif typ == "string":
                 # 处理特定格式
-                if "format" in definition:
-                    if definition["format"] == "email":
-                        value = fake.email()
-                    elif definition["format"] == "date-time":
-                        value = fake.iso8601()
-                    elif definition["format"] == "uri":
-                        value = fake.uri()
-                    else:
-                        value = fake.word()
-                else:
-                    value = fake.word()
+                gen = partial(choice, _FORMAT_POOLS.get(definition.get("format"), _WORD_POOL))
             elif typ == "integer":
-                min_val = definition.get("minimum", 0)
-                max_val = definition.get("maximum", 100)
-                value = fake.random_int(min=min_val, max=max_val)
+                gen = partial(random.randint, definition.get("minimum", 0), definition.get("maximum", 100))
             elif typ == "number":
-                min_val = definition.get("minimum", 0)
-                max_val = definition.get("maximum", 100)
-                value = round(min_val + random.random() * (max_val - min_val), 2)
+                def gen(min_val=definition.get("minimum", 0), max_val=definition.get("maximum", 100)):
+                    return round(min_val + random.random() * (max_val - min_val), 2)
             elif typ == "boolean":
-                value = fake.boolean()
+                def gen():
+                    return random.random() < 0.5
             elif typ == "object":
-                value = SchemaUtils.generate_example(definition)
+                gen = SchemaUtils.compile_generator(definition)
             elif typ == "array":
-                items_def = definition.get("items", {"type": "string"})
+                items_gen = SchemaUtils.compile_generator(definition.get("items", {"type": "string"}))
                 min_items = definition.get("minItems", 1)
-                max_items = definition.get("maxItems", 3)
-                num_items = random.randint(min_items, max_items)
-                value = [SchemaUtils.generate_example(items_def) for _ in range(num_items)]
+                # 只设置了 minItems 时，默认的 maxItems 可能小于 minItems
+                max_items = max(definition.get("maxItems", 3), min_items)
+
+                def gen(items_gen=items_gen, min_items=min_items, max_items=max_items):
+                    return [items_gen() for _ in range(random.randint(min_items, max_items))]
+            elif is_required:
+                # 无法识别的类型：必需字段用随机单词补齐，非必需字段不输出
+                gen = partial(choice, _WORD_POOL)
+            else:
+                continue
+            gens.append((prop, gen))
 
-            if value is not None or prop in required:
-                example[prop] = value if value is not None else fake.word()
+        def generate() -> Dict:
+            example = {}
+            for prop, gen in gens:
+                value = gen()
+                if value is not _OMIT:
+                    example[prop] = value
+            return example
 
-        return example
+        return generate
+
+    @staticmethod
+    def generate_example(schema: Dict) -> Dict:
+        """根据 schema 生成一条示例数据"""
+        return SchemaUtils.compile_generator(schema)()
+
+@dataclass
+class SchemaStats:
+    """schema 顶层字段的分类计数，用于判断演化操作是否可行"""
+
+    n_props: int = 0
+    n_string: int = 0
+    n_numeric: int = 0
+    n_primitive: int = 0  # string / number / integer / boolean
+    n_object_with_props: int = 0
+    n_array: int = 0
+    n_enum: int = 0
+    len_required: int = 0
+
+    @classmethod
+    def from_schema(cls, schema: Dict) -> "SchemaStats":
+        """遍历一次顶层 properties 完成统计"""
+        props = schema.get("properties", {})
+        stats = cls(n_props=len(props), len_required=len(schema.get("required", ())))
+        for field_def in props.values():
+            typ = field_def.get("type")
+            if typ == "string":
+                stats.n_string += 1
+                stats.n_primitive += 1
+            elif typ == "integer" or typ == "number":
+                stats.n_numeric += 1
+                stats.n_primitive += 1
+            elif typ == "boolean":
+                stats.n_primitive += 1
+            elif typ == "object":
+                if field_def.get("properties"):
+                    stats.n_object_with_props += 1
+            elif typ == "array":
+                stats.n_array += 1
+            if "enum" in field_def:
+                stats.n_enum += 1
+        return stats
+
+    def as_tuple(self) -> Tuple[int, ...]:
+        """按字段定义顺序返回各计数"""
+        return (self.n_props, self.n_string, self.n_numeric, self.n_primitive,
+                self.n_object_with_props, self.n_array, self.n_enum, self.len_required)
+
+
+@dataclass(frozen=True, slots=True)
+class EvolutionOp:
+    """演化操作描述：实现函数名、选择权重和类别"""
+
+    func: str
+    weight: int
+    category: str
 
 
 class EnhancedSchemaEvolutionStrategy:
     """增强的Schema演化策略，覆盖结构、约束和语义演化"""
 
     # 定义一个操作池，包含各种演化操作及其权重和类别
-    EVOLUTION_OPERATIONS = [
+    EVOLUTION_OPERATIONS = (
         # 结构演化 - 字段级操作
-        {"func": "add_field", "weight": 15, "category": "structural"},
-        {"func": "remove_field", "weight": 10, "category": "structural"},
-        {"func": "rename_field", "weight": 8, "category": "structural"},
-        {"func": "change_field_type", "weight": 5, "category": "structural"},
+        EvolutionOp("add_field", 15, "structural"),
+        EvolutionOp("remove_field", 10, "structural"),
+        EvolutionOp("rename_field", 8, "structural"),
+        EvolutionOp("change_field_type", 5, "structural"),
 
         # 结构演化 - 嵌套结构操作
-        {"func": "nest_fields", "weight": 5, "category": "structural"},
-        {"func": "unnest_field", "weight": 5, "category": "structural"},
-        {"func": "promote_field", "weight": 4, "category": "structural"},
-        {"func": "demote_field", "weight": 4, "category": "structural"},
-        {"func": "change_array_structure", "weight": 4, "category": "structural"},
+        EvolutionOp("nest_fields", 5, "structural"),
+        EvolutionOp("unnest_field", 5, "structural"),
+        EvolutionOp("promote_field", 4, "structural"),
+        EvolutionOp("demote_field", 4, "structural"),
+        EvolutionOp("change_array_structure", 4, "structural"),
 
         # 约束演化
-        {"func": "change_required_constraint", "weight": 8, "category": "constraint"},
-        {"func": "change_enum_options", "weight": 6, "category": "constraint"},
-        {"func": "change_min_max_constraint", "weight": 7, "category": "constraint"},
-        {"func": "change_pattern_constraint", "weight": 4, "category": "constraint"},
+        EvolutionOp("change_required_constraint", 8, "constraint"),
+        EvolutionOp("change_enum_options", 6, "constraint"),
+        EvolutionOp("change_min_max_constraint", 7, "constraint"),
+        EvolutionOp("change_pattern_constraint", 4, "constraint"),
 
         # 语义演化
-        {"func": "split_field", "weight": 3, "category": "semantic"},
-        {"func": "merge_fields", "weight": 3, "category": "semantic"},
-        {"func": "add_conditional_validation", "weight": 4, "category": "semantic"},
-    ]
-
-    # 记录已执行的操作类型，确保覆盖全面
-    executed_operations = set()
+        EvolutionOp("split_field", 3, "semantic"),
+        EvolutionOp("merge_fields", 3, "semantic"),
+        EvolutionOp("add_conditional_validation", 4, "semantic"),
+    )
 
     @staticmethod
-    def get_available_operations(schema: Dict, version_num: int) -> List[dict]:
+    def get_available_operations(schema: Dict, version_num: int) -> List[EvolutionOp]:
         """根据当前schema状态获取可用的演化操作"""
-        available_ops = []
+        # 只遍历一次 properties 统计各类字段数；各计数截断到饱和值后作为缓存键，
+        # 字段数较多的 schema 之间可行操作集合通常相同，可直接复用
+        stats = SchemaStats.from_schema(schema)
+        key = tuple(map(min, stats.as_tuple(), EnhancedSchemaEvolutionStrategy._STATS_SATURATION))
+        return list(EnhancedSchemaEvolutionStrategy._viable_operations(key))
 
-        for op in EnhancedSchemaEvolutionStrategy.EVOLUTION_OPERATIONS:
-            # 检查操作是否可行（有足够的字段、合适的结构等）
-            if EnhancedSchemaEvolutionStrategy._is_operation_viable(op["func"], schema):
-                available_ops.append(op)
-
-        # 优先选择尚未执行过的操作类型，确保覆盖全面
-        for op in available_ops:
-            if op["func"] not in EnhancedSchemaEvolutionStrategy.executed_operations:
-                op["weight"] *= 2  # 提高未执行操作的权重
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _viable_operations(stats_key: Tuple[int, ...]) -> Tuple[EvolutionOp, ...]:
+        """按截断后的计数筛选可行的演化操作"""
+        stats = SchemaStats(*stats_key)
+        # 检查操作是否可行（有足够的字段、合适的结构等）
+        return tuple(
+            op for op in EnhancedSchemaEvolutionStrategy.EVOLUTION_OPERATIONS
+            if EnhancedSchemaEvolutionStrategy._is_operation_viable(op.func, stats)
+        )
 
-        return available_ops
+    @staticmethod
+    def _sample_operation(available_ops: List[EvolutionOp], executed: Set[str]) -> EvolutionOp:
+        """从可用操作中按权重随机选择一个，executed 为已执行过的操作名
+
+        在全部操作上用别名表 O(1) 采样，抽到不可用的操作时重抽；大多数操作通常可用，期望重抽次数接近 0。
+        """
+        ops = EnhancedSchemaEvolutionStrategy.EVOLUTION_OPERATIONS
+        # 优先选择尚未执行过的操作类型，确保覆盖全面：未执行操作的权重加倍
+        weights = tuple(op.weight if op.func in executed else op.weight * 2 for op in ops)
+        prob, alias = _alias_table(weights)
+        available = {op.func for op in available_ops}
+        n = len(ops)
+        while True:
+            i = random.randrange(n)
+            if random.random() >= prob[i]:
+                i = alias[i]
+            if ops[i].func in available:
+                return ops[i]
+
+    # 各操作的可行性判断，只依赖 SchemaStats 中的计数
+    _VIABILITY_CHECKS = {
+        "add_field": lambda st: st.n_props < 20,  # 防止字段过多
+        "remove_field": lambda st: st.n_props > 3,  # 至少保留3个字段
+        "rename_field": lambda st: st.n_props > 0,
+        "change_field_type": lambda st: st.n_primitive > 0,
+        "nest_fields": lambda st: st.n_props >= 2,
+        "unnest_field": lambda st: st.n_object_with_props > 0,
+        "promote_field": lambda st: st.n_object_with_props > 0,
+        "demote_field": lambda st: st.n_primitive >= 2,
+        "change_required_constraint": lambda st: st.len_required > 0,
+        "change_enum_options": lambda st: st.n_enum > 0,
+        "change_min_max_constraint": lambda st: st.n_numeric > 0,
+        "change_pattern_constraint": lambda st: st.n_string > 0,
+        "split_field": lambda st: st.n_string > 0,
+        "merge_fields": lambda st: st.n_props >= 2,
+        "add_conditional_validation": lambda st: st.n_props >= 2,
+        "change_array_structure": lambda st: st.n_array > 0,
+    }
+
+    # SchemaStats 各计数（按 as_tuple 顺序）的饱和值：计数超过该值后上面的判断结果不再变化。
+    # 修改 _VIABILITY_CHECKS 中的阈值时需同步调整
+    _STATS_SATURATION = (20, 1, 1, 2, 1, 1, 1, 1)
 
     @staticmethod
-    def _is_operation_viable(operation: str, schema: Dict) -> bool:
+    def _is_operation_viable(operation: str, stats: "SchemaStats") -> bool:
         """检查特定操作在当前schema下是否可行"""
-        props = schema.get("properties", {})
-
-        viability_checks = {
-            "add_field": lambda: len(props) < 20,  # 防止字段过多
-            "remove_field": lambda: len(props) > 3,  # 至少保留3个字段
-            "rename_field": lambda: len(props) > 0,
-            "change_field_type": lambda: any(
-                field_def.get("type") in ["string", "number", "integer", "boolean"]
-                for field_def in props.values()
-            ),
-            "nest_fields": lambda: len(props) >= 2,
-            "unnest_field": lambda: any(
-                field_def.get("type") == "object" and field_def.get("properties")
-                for field_def in props.values()
-            ),
-            "promote_field": lambda: any(
-                field_def.get("type") == "object" and field_def.get("properties")
-                for field_def in props.values()
-            ),
-            "demote_field": lambda: len([
-                k for k, v in props.items()
-                if v.get("type") in ["string", "number", "integer", "boolean"]
-            ]) >= 2,
-            "change_required_constraint": lambda: "required" in schema and len(schema["required"]) > 0,
-            "change_enum_options": lambda: any(
-                "enum" in field_def for field_def in props.values()
-            ),
-            "change_min_max_constraint": lambda: any(
-                field_def.get("type") in ["integer", "number"]
-                for field_def in props.values()
-            ),
-            "change_pattern_constraint": lambda: any(
-                field_def.get("type") == "string"
-                for field_def in props.values()
-            ),
-            "split_field": lambda: any(
-                field_def.get("type") == "string"
-                for field_def in props.values()
-            ),
-            "merge_fields": lambda: len(props) >= 2,
-            "add_conditional_validation": lambda: len(props) >= 2,
-            "change_array_structure": lambda: any(
-                field_def.get("type") == "array"
-                for field_def in props.values()
-            ),
-        }
-
-        return viability_checks.get(operation, lambda: True)()
+        check = EnhancedSchemaEvolutionStrategy._VIABILITY_CHECKS.get(operation)
+        return check is None or check(stats)
 
     @staticmethod
-    def evolve_schema(schema: Dict, version_num: int) -> Tuple[Dict, str]:
-        """执行schema演化，可能包含多个操作"""
+    def evolve_schema(schema: Dict, version_num: int, executed: Optional[Set[str]] = None) -> Tuple[Dict, str]:
+        """执行schema演化，可能包含多个操作
+
+        executed 记录同一演化序列中已执行的操作类型，由调用方持有并跨版本传入，用于提高未执行操作的权重；
+        策略类本身不保存状态，不同 schema 的演化可在多个进程中并行执行。
+        """
+        if executed is None:
+            executed = set()
         available_ops = EnhancedSchemaEvolutionStrategy.get_available_operations(schema, version_num)
 
         if not available_ops:
             return schema, "无可用演化操作"
 
         # 加权随机选择操作
-        weights = [op["weight"] for op in available_ops]
-        selected_op = random.choices(available_ops, weights=weights, k=1)[0]
+        selected_op = EnhancedSchemaEvolutionStrategy._sample_operation(available_ops, executed)
 
         # 执行选中的操作
-        operation_func = getattr(EnhancedSchemaEvolutionStrategy, selected_op["func"])
-        new_schema, description = operation_func(schema, version_num)
+        new_schema, description = _OPERATION_FUNCS[selected_op.func](schema, version_num)
 
         # 记录已执行的操作
-        EnhancedSchemaEvolutionStrategy.executed_operations.add(selected_op["func"])
+        executed.add(selected_op.func)
 
-        return new_schema, f"{selected_op['category']}: {description}"
+        return new_schema, f"{selected_op.category}: {description}"
 
     # ===== 结构演化操作 =====
 
     @staticmethod
     def add_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """添加新字段"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.setdefault("properties", {})
         required = new_schema.setdefault("required", [])
 
         # 随机选择字段类型和名称
-        field_types = ["string", "integer", "number", "boolean", "object", "array"]
-        field_type = random.choice(field_types)
-
-        base_names = ["field", "property", "attr", "item", "running_case"]
-        new_field = f"{random.choice(base_names)}_{version_num}"
+        field_type = random.choice(_FIELD_TYPES)
+        new_field = f"{random.choice(_BASE_NAMES)}_{version_num}"
 
         # 创建字段定义
         field_def = {"type": field_type}
 
         # 为特定类型添加额外属性
         if field_type == "string":
-            formats = ["email", "date-time", "uri", "hostname", None]
-            format_choice = random.choice(formats)
+            format_choice = random.choice(_FORMATS)
             if format_choice:
                 field_def["format"] = format_choice
 
@@ -247,8 +512,7 @@ class EnhancedSchemaEvolutionStrategy:
                 field_def["maximum"] = random.randint(101, 200)
 
         elif field_type == "array":
-            item_types = ["string", "integer", "number", "boolean", "object"]
-            field_def["items"] = {"type": random.choice(item_types)}
+            field_def["items"] = {"type": random.choice(_ITEM_TYPES)}
             if random.random() > 0.5:
                 field_def["minItems"] = random.randint(1, 5)
             if random.random() > 0.5:
@@ -272,7 +536,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def remove_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """删除字段（优先选择非必需字段）"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -280,7 +544,8 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无字段可删除"
 
         # 优先删除非必需字段
-        non_required = [k for k in props.keys() if k not in required]
+        required_set = set(required)
+        non_required = [k for k in props if k not in required_set]
         candidates = non_required if non_required else list(props.keys())
 
         if not candidates:
@@ -297,14 +562,14 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def rename_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """重命名字段"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
         if not props:
             return new_schema, "无字段可重命名"
 
-        field_to_rename = random.choice(list(props.keys()))
+        field_to_rename = _pick_key(props)
         new_name = f"{field_to_rename}_renamed_v{version_num}"
 
         props[new_name] = props.pop(field_to_rename)
@@ -318,7 +583,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def change_field_type(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """修改字段类型"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
 
         # 找到可以修改类型的字段
@@ -359,7 +624,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def nest_fields(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """将多个字段嵌套到一个新对象中"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -367,7 +632,7 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "字段不足，无法创建嵌套"
 
         # 选择要嵌套的字段（2-3个）
-        fields_to_nest = random.sample(list(props.keys()), min(3, len(props)))
+        fields_to_nest = _sample_keys(props, 3)
         nest_name = f"nested_object_v{version_num}"
 
         # 创建嵌套对象
@@ -391,7 +656,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def unnest_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """将嵌套对象的字段提升到顶层"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -405,7 +670,8 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无嵌套对象可解嵌套"
 
         object_to_unnest = random.choice(nested_objects)
-        nested_props = props[object_to_unnest].get("properties", {})
+        object_def = props[object_to_unnest] = dict(props[object_to_unnest])
+        nested_props = object_def["properties"] = dict(object_def.get("properties", {}))
 
         if not nested_props:
             return new_schema, f"嵌套对象 '{object_to_unnest}' 无属性可解嵌套"
@@ -417,11 +683,12 @@ class EnhancedSchemaEvolutionStrategy:
         )
 
         # 提升字段到顶层
+        parent_required = object_to_unnest in required  # 循环中 required 只追加被提升的字段，结果不变
         for field in fields_to_promote:
             props[field] = nested_props.pop(field)
 
             # 如果原嵌套对象是必需的，提升的字段也设为必需
-            if object_to_unnest in required and random.random() > 0.5:
+            if parent_required and random.random() > 0.5:
                 required.append(field)
 
         # 如果嵌套对象为空，删除它
@@ -435,7 +702,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def change_array_structure(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """修改数组结构"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
 
         # 找到数组字段
@@ -445,21 +712,15 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无数组字段可修改"
 
         field_to_change = random.choice(array_fields)
-        array_def = props[field_to_change]
+        array_def = props[field_to_change] = dict(props[field_to_change])
 
         # 多种数组修改操作
-        operations = [
-            ("change_item_type", "修改数组项类型"),
-            ("add_min_max_items", "添加最小/最大项数限制"),
-            ("make_unique_items", "要求数组项唯一")
-        ]
-
-        op_name, op_desc = random.choice(operations)
+        op_name, op_desc = random.choice(_ARRAY_OPS)
 
         if op_name == "change_item_type":
             old_type = array_def.get("items", {}).get("type", "string")
-            new_type = random.choice(["string", "integer", "number", "boolean", "object"])
-            array_def.setdefault("items", {})["type"] = new_type
+            new_type = random.choice(_ITEM_TYPES)
+            array_def["items"] = {**array_def.get("items", {}), "type": new_type}
             return new_schema, f"修改数组 '{field_to_change}' 项类型: {old_type} → {new_type}"
 
         elif op_name == "add_min_max_items":
@@ -478,7 +739,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def promote_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """将嵌套字段提升到顶层"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -492,13 +753,14 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无嵌套对象可提升字段"
 
         object_to_promote_from = random.choice(nested_objects)
-        nested_props = props[object_to_promote_from].get("properties", {})
+        object_def = props[object_to_promote_from] = dict(props[object_to_promote_from])
+        nested_props = object_def["properties"] = dict(object_def.get("properties", {}))
 
         if not nested_props:
             return new_schema, f"嵌套对象 '{object_to_promote_from}' 无属性可提升"
 
         # 选择要提升的字段
-        field_to_promote = random.choice(list(nested_props.keys()))
+        field_to_promote = _pick_key(nested_props)
         new_field_name = f"{object_to_promote_from}_{field_to_promote}"
 
         # 提升字段到顶层
@@ -519,7 +781,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def demote_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """将顶层字段降级到嵌套对象中"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -534,6 +796,8 @@ class EnhancedSchemaEvolutionStrategy:
 
         if nested_objects:
             target_object = random.choice(nested_objects)
+            # 复制目标对象及其 properties，再向其中移入字段
+            props[target_object] = {**props[target_object], "properties": dict(props[target_object]["properties"])}
         else:
             # 创建新的嵌套对象
             target_object = f"nested_object_v{version_num}"
@@ -561,9 +825,7 @@ class EnhancedSchemaEvolutionStrategy:
             required.remove(field_to_demote)
             # 随机决定是否在嵌套对象中设为必需
             if random.random() > 0.5:
-                if "required" not in props[target_object]:
-                    props[target_object]["required"] = []
-                props[target_object]["required"].append(field_to_demote)
+                props[target_object]["required"] = props[target_object].get("required", []) + [field_to_demote]
 
         return new_schema, f"将字段 '{field_to_demote}' 降级到嵌套对象 '{target_object}'"
 
@@ -572,14 +834,14 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def change_required_constraint(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """修改字段的必需约束"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.setdefault("required", [])
 
         if not props:
             return new_schema, "无字段可修改约束"
 
-        field_to_change = random.choice(list(props.keys()))
+        field_to_change = _pick_key(props)
 
         if field_to_change in required:
             # 从必需改为可选
@@ -593,7 +855,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def change_enum_options(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """修改枚举值选项"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
 
         # 找到有枚举约束的字段
@@ -603,11 +865,11 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无枚举字段可修改"
 
         field_to_change = random.choice(enum_fields)
+        props[field_to_change] = dict(props[field_to_change])
         old_enum = props[field_to_change]["enum"]
 
         # 枚举操作：添加选项、删除选项或替换所有选项
-        operations = ["add_option", "remove_option", "replace_all"]
-        operation = random.choice(operations)
+        operation = random.choice(_ENUM_OPS)
 
         if operation == "add_option" and len(old_enum) < 10:
             new_option = f"option_v{version_num}"
@@ -629,7 +891,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def change_min_max_constraint(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """修改数值字段的最小/最大约束"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
 
         # 找到数值字段
@@ -642,10 +904,10 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无数值字段可修改约束"
 
         field_to_change = random.choice(numeric_fields)
-        field_def = props[field_to_change]
+        field_def = props[field_to_change] = dict(props[field_to_change])
 
         # 随机选择要修改的约束
-        constraint_to_change = random.choice(["minimum", "maximum", "both"])
+        constraint_to_change = random.choice(_MIN_MAX_CHOICES)
 
         if constraint_to_change in ["minimum", "both"]:
             if "minimum" in field_def:
@@ -679,7 +941,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def change_pattern_constraint(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """修改字符串字段的模式约束"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
 
         # 找到字符串字段
@@ -689,26 +951,17 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "无字符串字段可修改模式约束"
 
         field_to_change = random.choice(string_fields)
-        field_def = props[field_to_change]
-
-        # 定义一些常见模式
-        patterns = [
-            "^[A-Za-z]+$",  # 只允许字母
-            "^[0-9]+$",  # 只允许数字
-            "^[A-Za-z0-9]+$",  # 字母数字
-            "^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}$",  # 电子邮件
-            "^(https?|ftp)://[^\\s/$.?#].[^\\s]*$",  # URL
-        ]
+        field_def = props[field_to_change] = dict(props[field_to_change])
 
         if "pattern" in field_def:
             # 修改现有模式
             old_pattern = field_def["pattern"]
-            new_pattern = random.choice(patterns)
+            new_pattern = random.choice(_PATTERNS)
             field_def["pattern"] = new_pattern
             return new_schema, f"修改字段 '{field_to_change}' 模式: '{old_pattern}' → '{new_pattern}'"
         else:
             # 添加新模式约束
-            new_pattern = random.choice(patterns)
+            new_pattern = random.choice(_PATTERNS)
             field_def["pattern"] = new_pattern
             return new_schema, f"为字段 '{field_to_change}' 添加模式约束: '{new_pattern}'"
 
@@ -717,7 +970,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def split_field(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """将一个字段拆分为多个字段"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -752,7 +1005,7 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def merge_fields(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """将多个字段合并为一个字段"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
         required = new_schema.get("required", [])
 
@@ -760,7 +1013,7 @@ class EnhancedSchemaEvolutionStrategy:
             return new_schema, "字段不足，无法合并"
 
         # 随机选择2-3个字段进行合并
-        fields_to_merge = random.sample(list(props.keys()), min(3, len(props)))
+        fields_to_merge = _sample_keys(props, 3)
         merged_field = f"merged_field_v{version_num}"
 
         # 创建合并后的字段
@@ -781,23 +1034,20 @@ class EnhancedSchemaEvolutionStrategy:
     @staticmethod
     def add_conditional_validation(schema: Dict, version_num: int) -> Tuple[Dict, str]:
         """添加条件验证逻辑"""
-        new_schema = deepcopy(schema)
+        new_schema = _copy_schema(schema)
         props = new_schema.get("properties", {})
 
         if len(props) < 2:
             return new_schema, "字段不足，无法添加条件验证"
 
         # 随机选择两个字段创建条件关系
-        field1, field2 = random.sample(list(props.keys()), 2)
+        field1, field2 = _sample_keys(props, 2)
 
         # 简单的条件验证：如果field1有特定值，则field2为必需
-        condition_value = random.choice(["true", "false", "yes", "no", "required", "optional"])
-
-        # 添加条件逻辑
-        if "allOf" not in new_schema:
-            new_schema["allOf"] = []
+        condition_value = random.choice(_CONDITION_VALUES)
 
-        new_schema["allOf"].append({
+        # 添加条件逻辑：生成新的 allOf 列表，不修改上一版本的列表
+        new_schema["allOf"] = new_schema.get("allOf", []) + [{
             "if": {
                 "properties": {
                     field1: {"const": condition_value}
@@ -806,60 +1056,162 @@ class EnhancedSchemaEvolutionStrategy:
             "then": {
                 "required": [field2]
             }
-        })
+        }]
 
         return new_schema, f"添加条件验证: 当 '{field1}' = '{condition_value}' 时, '{field2}' 为必需"
 
 
+# 操作名到实现函数的映射，在模块加载时解析一次，evolve_schema 中直接查表调用
+_OPERATION_FUNCS = {
+    op.func: getattr(EnhancedSchemaEvolutionStrategy, op.func)
+    for op in EnhancedSchemaEvolutionStrategy.EVOLUTION_OPERATIONS
+}
+
+
 class SchemaEvolver:
     """主类：管理 JSON Schema 的演化与数据生成"""
 
     def __init__(self, output_dir: str = "./evolved_dataset",
                  num_versions: int = 10,
-                 num_docs_per_version: int = 5):
-        """初始化演化器"""
+                 num_docs_per_version: int = 5,
+                 max_workers: Optional[int] = None,
+                 docs_format: str = "json"):
+        """初始化演化器
+
+        max_workers 为并行生成的进程数，默认取 CPU 核数，为 1 时在当前进程内顺序执行。
+        docs_format 为 "json" 时每个文档写入 v<n>/<doc_id>.json；为 "ndjson" 时每个版本的全部文档
+        按 doc_id 顺序逐行写入 v<n>/docs.ndjson，适合文档数很多、只需顺序读取的场景。
+        """
+        if docs_format not in ("json", "ndjson"):
+            raise ValueError(f"不支持的文档输出格式: {docs_format}")
         self.output_dir = output_dir
         self.num_versions = num_versions
         self.num_docs_per_version = num_docs_per_version
+        self.max_workers = max_workers
+        self.docs_format = docs_format
         os.makedirs(self.output_dir, exist_ok=True)
 
+    @staticmethod
+    def _dump_json(data: Dict) -> bytes:
+        """序列化为 UTF-8 JSON 字节，优先使用 orjson"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            except TypeError:  # 超出 64 位的整数等 orjson 无法序列化的值，交给标准库处理
+                pass
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def _write_bytes(file_path: str, payload: bytes) -> None:
+        """将序列化好的内容一次性写入文件：直接用 os.open/os.write，绕过缓冲 IO 层"""
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+        try:
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
     def _save_json_file(self, data: Dict, file_path: str) -> None:
-        """保存 JSON 数据到文件"""
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        """保存 JSON 数据到文件：先序列化为完整内容再一次写入"""
+        self._write_bytes(file_path, self._dump_json(data))
+
+    @staticmethod
+    def _dump_json_line(data: Dict) -> bytes:
+        """序列化为不带缩进的单行 UTF-8 JSON 字节，优先使用 orjson"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _save_ndjson_file(self, docs: List[Dict], file_path: str) -> None:
+        """将多个文档按行写入同一个 NDJSON 文件"""
+        self._write_bytes(file_path, b"".join(self._dump_json_line(doc) + b"\n" for doc in docs))
+
+    def _writer_loop(self, write_q: queue.Queue, errors: List[BaseException]) -> None:
+        """后台写文件线程：依次取出 (save, data, file_path) 并调用 save(data, file_path)，收到 None 时退出
+
+        写入出错时记录异常并继续取空队列，避免生产方阻塞在已满的队列上。
+        """
+        while True:
+            item = write_q.get()
+            if item is None:
+                return
+            if errors:
+                continue
+            save, data, file_path = item
+            try:
+                save(data, file_path)
+            except BaseException as e:
+                errors.append(e)
 
     def _generate_version(self, schema: Dict, subset: str, unique_id: str) -> List[str]:
-        """为单个 schema 生成多个版本和示例数据"""
+        """为单个 schema 生成多个版本和示例数据
+
+        序列化与写文件交给后台线程，与 schema 演化和示例数据生成重叠执行。
+        入队的 schema 与示例数据之后不会再被修改，可安全地跨线程读取。
+        """
         current_schema = schema
         log = []
         entity_dir = os.path.join(self.output_dir, subset, unique_id)
         os.makedirs(entity_dir, exist_ok=True)
-
-        # 重置已执行操作记录
-        EnhancedSchemaEvolutionStrategy.executed_operations = set()
-
-        for v in range(1, self.num_versions + 1):
-            # 演化 schema
-            evolved_schema, desc = EnhancedSchemaEvolutionStrategy.evolve_schema(current_schema, v)
-            schema_dir = os.path.join(entity_dir, f"v{v}")
-            os.makedirs(schema_dir, exist_ok=True)
-
-            # 保存 schema
-            self._save_json_file(evolved_schema, os.path.join(schema_dir, "schema.json"))
-
-            # 生成并保存示例数据
-            for doc_id in range(1, self.num_docs_per_version + 1):
-                data = SchemaUtils.generate_example(evolved_schema)
-                self._save_json_file(data, os.path.join(schema_dir, f"{doc_id}.json"))
-
-            log.append(f"v{v}: {desc}")
-            current_schema = evolved_schema
+        # 一次性创建所有版本目录，版本循环中不再检查目录；输出路径直接用 f-string 拼接
+        version_dirs = [f"{entity_dir}/v{v}" for v in range(1, self.num_versions + 1)]
+        for schema_dir in version_dirs:
+            try:
+                os.mkdir(schema_dir)
+            except FileExistsError:
+                pass
+
+        # 每个 schema 的演化序列单独记录已执行的操作
+        executed = set()
+
+        # 写线程随实体创建和结束，SchemaEvolver 本身仍可被 pickle 传给进程池
+        write_q = queue.Queue(maxsize=64)
+        write_errors = []
+        writer = threading.Thread(target=self._writer_loop, args=(write_q, write_errors), daemon=True)
+        writer.start()
+        try:
+            for v in range(1, self.num_versions + 1):
+                # 演化 schema
+                evolved_schema, desc = EnhancedSchemaEvolutionStrategy.evolve_schema(current_schema, v, executed)
+                schema_dir = version_dirs[v - 1]
+
+                # 保存 schema
+                write_q.put((self._save_json_file, evolved_schema, f"{schema_dir}/schema.json"))
+
+                # 生成并保存示例数据：每个版本只编译一次生成函数
+                generate = SchemaUtils.compile_generator(evolved_schema)
+                if self.docs_format == "ndjson":
+                    docs = [generate() for _ in range(self.num_docs_per_version)]
+                    write_q.put((self._save_ndjson_file, docs, f"{schema_dir}/docs.ndjson"))
+                else:
+                    for doc_id in range(1, self.num_docs_per_version + 1):
+                        write_q.put((self._save_json_file, generate(), f"{schema_dir}/{doc_id}.json"))
+
+                log.append(f"v{v}: {desc}")
+                current_schema = evolved_schema
+        finally:
+            # 等待已入队的文件全部写完
+            write_q.put(None)
+            writer.join()
+        if write_errors:
+            raise write_errors[0]
 
         # 保存变更日志
         with open(os.path.join(entity_dir, "change_log.txt"), "w", encoding="utf-8") as f:
             f.write("\n".join(log))
         return log
 
+    def _generate_entity(self, entity: Tuple[str, str, Dict]) -> List[str]:
+        """处理单个 (subset, unique_id, schema)，作为进程池任务执行"""
+        subset, unique_id, schema = entity
+        # 按子集和 unique_id 设定随机种子，并行执行时每个 schema 的结果仍可复现
+        random.seed(f"{subset}/{unique_id}")
+        return self._generate_version(schema, subset, unique_id)
+
     def _process_hf_dataset(self, dataset_name: str, max_schemas_per_subset: int = 5, min_fields: int = 5) -> List[
         Tuple[str, str, Dict]]:
         """处理 Hugging Face 数据集"""
@@ -875,14 +1227,16 @@ class SchemaEvolver:
 
         for subset in subsets:
             try:
-                ds = load_dataset(dataset_name, name=subset)
+                # 流式读取：只拉取实际遍历到的行，取满 max_schemas_per_subset 个后即停止
+                ds = load_dataset(dataset_name, name=subset, streaming=True)
                 train_schemas = ds["train"]
             except Exception as e:
                 print(f"加载子集 {subset} 失败: {e}")
                 continue
 
             subset_processed_count = 0
-            for example in train_schemas:
+            # 后台预取下一行，网络/磁盘读取与当前行的解析、过滤重叠
+            for example in _prefetch(train_schemas):
                 if subset_processed_count >= max_schemas_per_subset:
                     break
 
@@ -892,11 +1246,11 @@ class SchemaEvolver:
                     continue
 
                 try:
-                    schema = json.loads(schema_str)
+                    schema = _loads_json(schema_str)
                 except json.JSONDecodeError:
                     continue
 
-                if SchemaUtils.count_fields(schema) < min_fields:
+                if not SchemaUtils.has_at_least_fields(schema, min_fields):
                     continue
 
                 subset_processed_count += 1
@@ -920,9 +1274,13 @@ class SchemaEvolver:
         else:
             processed_schemas = self._process_hf_dataset(source, **kwargs)
 
-        # 生成演化版本和数据
-        for subset, unique_id, schema in processed_schemas:
-            self._generate_version(schema, subset, unique_id)
+        # 生成演化版本和数据：各 schema 相互独立，按进程并行
+        if self.max_workers == 1 or len(processed_schemas) <= 1:
+            for entity in processed_schemas:
+                self._generate_entity(entity)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(self._generate_entity, processed_schemas))
 
         print(f"生成完成！总计处理了 {len(processed_schemas)} 个 schema")
         return processed_schemas
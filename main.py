@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+
 def main():
     import sys
     # 读取输入的数字
@@ -18,12 +21,9 @@ def main():
     # 最大可能的数位和是9*19=171
     prime_flags = generate_primes(171)
 
-    # 初始化记忆化数组
-    # dp[位置][前一位+1][是否受限][是否开始][当前和] = -1(未知), 0(否), 1(是)
-    memo = [[[[[-1 for _ in range(172)] for __ in range(2)] for ___ in range(2)] for ____ in range(11)] for _____ in
-            range(str_length + 1)]
-
     # 深度优先搜索判断是否存在符合条件的数
+    # 以 (位置, 前一位, 是否受限, 是否开始, 当前和) 为键记忆化，只缓存实际访问到的状态
+    @lru_cache(maxsize=None)
     def dfs_search(position, last_digit, is_limited, has_started, current_sum):
         if current_sum > 171:
             return False
@@ -32,12 +32,6 @@ def main():
             # 必须已经开始(非零)且数位和为质数
             return has_started == 1 and prime_flags[current_sum]
 
-        # 计算前一位的索引（将-1转换为0）
-        last_idx = last_digit + 1
-        # 检查记忆
-        if memo[position][last_idx][is_limited][has_started][current_sum] != -1:
-            return memo[position][last_idx][is_limited][has_started][current_sum] == 1
-
         # 确定当前位的最大可能数字
         max_digit = int(number_str[position]) if is_limited else 9
 
@@ -57,11 +51,9 @@ def main():
             # 递归检查下一位
             if dfs_search(position + 1, digit if new_started == 1 else last_digit,
                           new_limited, new_started, new_sum):
-                memo[position][last_idx][is_limited][has_started][current_sum] = 1
                 return True
 
         # 没有找到符合条件的数字
-        memo[position][last_idx][is_limited][has_started][current_sum] = 0
         return False
 
     # 检查是否存在解
@@ -7,6 +7,7 @@ export_schema_and_ops.py
   2) 计算相邻版本间的模式演化操作，并输出 JSON
 """
 import os, sys, json, argparse, importlib.util
+from collections import defaultdict, deque
 from typing import Dict, Any, Tuple, List
 
 def load_module(path: str):
@@ -27,17 +28,22 @@ def get_schemas(mod, versions):
 # ----------diff helpers----------
 def norm_type(t): return tuple(sorted(t)) if isinstance(t, list) else t
 def walk(schema: Dict[str, Any], root="$") -> Dict[str, Dict[str, Any]]:
+    # 显式栈先序遍历（子节点逆序入栈，顺序与递归一致）；路径 intern 后作为索引键
     idx = {}
-    def _walk(p, node):
-        idx[p] = node
-        if node.get("bsonType") == "object":
-            for k,v in (node.get("properties") or {}).items():
-                _walk(f"{p}.{k}", v)
-        elif node.get("bsonType") == "array":
+    stack = [(root, schema)]
+    while stack:
+        p, node = stack.pop()
+        idx[sys.intern(p)] = node
+        bt = node.get("bsonType")
+        if bt == "object":
+            prefix = p + "."
+            children = [(prefix + k, v) for k, v in (node.get("properties") or {}).items()]
+            children.reverse()
+            stack.extend(children)
+        elif bt == "array":
             it = node.get("items")
             if isinstance(it, dict):
-                _walk(f"{p}[]", it)
-    _walk(root, schema)
+                stack.append((p + "[]", it))
     return idx
 
 def type_change(a,b,p):
@@ -52,7 +58,7 @@ def type_change(a,b,p):
 def required_ops(a,b,p):
     ops=[]
     if a.get("bsonType")=="object" and b.get("bsonType")=="object":
-        A=set(a.get("required",[]) or []); B=set(b.get("required",[]) or [])
+        A=frozenset(a.get("required") or ()); B=frozenset(b.get("required") or ())
         for x in B-A: ops.append({"op":"AddRequired","path":f"{p}.{x}"})
         for x in A-B: ops.append({"op":"DropRequired","path":f"{p}.{x}"})
     return ops
@@ -62,7 +68,7 @@ def range_enum_ops(a,b,p):
     # Range
     amin,amax=a.get("minimum"),a.get("maximum")
     bmin,bmax=b.get("minimum"),b.get("maximum")
-    if (amin,bmax)!=(bmin,bmax):
+    if (amin,amax)!=(bmin,bmax):
         if (amin is None and amax is None) and (bmin is not None or bmax is not None):
             ops.append({"op":"AddRange","path":p,"spec":{"minimum":bmin,"maximum":bmax}})
         elif (bmin is None and bmax is None) and (amin is not None or amax is not None):
@@ -72,7 +78,7 @@ def range_enum_ops(a,b,p):
                         "from":{"minimum":amin,"maximum":amax},
                         "to":{"minimum":bmin,"maximum":bmax}})
     # Enum
-    e1,e2=tuple(a.get("enum",[]) or []),tuple(b.get("enum",[]) or [])
+    e1,e2=tuple(a.get("enum") or ()),tuple(b.get("enum") or ())
     if e1!=e2:
         if not e1 and e2: ops.append({"op":"AddEnum","path":p,"values":list(e2)})
         elif e1 and not e2: ops.append({"op":"DropEnum","path":p})
@@ -80,33 +86,39 @@ def range_enum_ops(a,b,p):
     return ops
 
 def detect_moves_and_renames(old_idx,new_idx):
-    rem=list(set(old_idx)-set(new_idx))
-    add=list(set(new_idx)-set(old_idx))
-    # 简化：直接按同名匹配 Move
+    rem=list(old_idx.keys()-new_idx.keys())
+    add=list(new_idx.keys()-old_idx.keys())
+    # 简化：直接按同名匹配 Move。新增路径按末段字段名分组，每个删除路径取同名组中最靠前的一个配对
     renames,moves=[],[]
-    for r in rem[:]:
-        name=r.split(".")[-1]
-        for a in add[:]:
-            if name==a.split(".")[-1]:
-                moves.append((r,a))
-                rem.remove(r); add.remove(a)
-                break
-    return renames,moves,rem,add
+    add_by_name=defaultdict(deque)
+    for a in add:
+        add_by_name[a.rpartition(".")[2]].append(a)
+    rem_eff,matched=[],set()
+    for r in rem:
+        group=add_by_name.get(r.rpartition(".")[2])
+        if group:
+            a=group.popleft()
+            moves.append((r,a)); matched.add(a)
+        else:
+            rem_eff.append(r)
+    add_eff=[a for a in add if a not in matched]
+    return renames,moves,rem_eff,add_eff
 
 def diff_schemas(A,B):
     a=walk(A); b=walk(B)
-    rem,add=set(a)-set(b),set(b)-set(a)
-    common=set(a)&set(b)
+    # 删除/新增路径由 detect_moves_and_renames 计算，这里只需共有路径；直接对 dict 键视图做集合运算
+    common=a.keys()&b.keys()
     ops=[]
     renames,moves,rem_eff,add_eff=detect_moves_and_renames(a,b)
     for p in rem_eff: ops.append({"op":"DropField","path":p})
     for p in add_eff: ops.append({"op":"AddField","path":p,"dtype":b[p].get("bsonType")})
     for o,n in moves: ops.append({"op":"MoveField","from":o,"to":n})
     for p in common:
-        ops += required_ops(a[p],b[p],p)
-        r = range_enum_ops(a[p],b[p],p)
+        na,nb=a[p],b[p]
+        ops += required_ops(na,nb,p)
+        r = range_enum_ops(na,nb,p)
         if r: ops += r
-        t = type_change(a[p],b[p],p)
+        t = type_change(na,nb,p)
         if t: ops.append(t)
     return ops
 
@@ -5,51 +5,191 @@ Build & Load Yelp Running Case (S0–S8) into MongoDB, with per-version cap.
 
 Quick install:
   pip install pymongo python-dateutil
+  pip install orjson pysimdjson   # 可选，加速 NDJSON 解析
+  pip install fastjsonschema      # 可选，客户端预编译校验
 """
 
 import argparse
 import json
+import mmap
 import re
-from typing import Dict, Any, Iterable, Optional, Tuple
-from pymongo import MongoClient
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from multiprocessing import Pool
+from operator import itemgetter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import bson
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING, IndexModel, MongoClient, WriteConcern
 from dateutil import parser as dateparser
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
 # ---------------------- IO ----------------------
 
+def _loads_json(line: bytes):
+    """解析一行 JSON：优先 orjson（直接接受 bytes），解析失败时再交给标准库（兼容 NaN 等扩展写法）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line)
+
+# 每次从文件读取的字节数
+_READ_CHUNK = 16 << 20
+
+def _iter_ndjson_lines(path: str) -> Iterable[bytes]:
+    # 优先 mmap 整个文件，用 C 层的 find 定位换行、直接切片出每一行，不经过 read 缓冲区的复制；
+    # 空文件或不支持 mmap 的文件（管道等）退回分块读取
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mm = None
+        if mm is not None:
+            with mm:
+                find = mm.find
+                start = 0
+                while True:
+                    nl = find(b"\n", start)
+                    line = mm[start:] if nl < 0 else mm[start:nl]
+                    line = line.strip()
+                    if line:
+                        yield line
+                    if nl < 0:
+                        return
+                    start = nl + 1
+    yield from _iter_ndjson_blocks(path)
+
+def _iter_ndjson_blocks(path: str) -> Iterable[bytes]:
+    # 以二进制方式大块读取再按 b"\n" 切行，省去逐行 utf-8 解码和逐行 readline 的开销；
+    # 块尾不完整的一行留到下一块
+    with open(path, "rb", buffering=0) as f:
+        tail = b""
+        while True:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            lines = chunk.split(b"\n")
+            lines[0] = tail + lines[0]
+            tail = lines.pop()
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield line
+        tail = tail.strip()
+        if tail:
+            yield tail
+
 def stream_ndjson(path: str, limit: Optional[int]=None) -> Iterable[Dict[str, Any]]:
     n = 0
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
+    for line in _iter_ndjson_lines(path):
+        try:
+            obj = _loads_json(line)
+        except json.JSONDecodeError:
+            continue
+        yield obj
+        n += 1
+        if limit is not None and n >= limit:
+            break
+
+# 构建商户 lookup 需要的字段，stream_business_lookup 按这个顺序取值
+_BIZ_FIELDS = ("business_id", "name", "categories", "city", "state", "stars")
+
+def _stream_simdjson(path: str, fields: Tuple[str, ...]) -> Iterable[Tuple[Any, ...]]:
+    # 复用同一个 parser；只要还有 simdjson.Object/Array 引用上一份文档，再次 parse 就会抛 RuntimeError，
+    # 所以所需字段在这里就转成普通 Python 值，只产出元组，惰性对象不离开本函数
+    parser = simdjson.Parser()
+    for line in _iter_ndjson_lines(path):
+        try:
+            doc = parser.parse(line)
+        except ValueError:
+            # simdjson 不接受的写法（NaN 等）交给常规解析
             try:
-                obj = json.loads(line)
+                obj = _loads_json(line)
             except json.JSONDecodeError:
                 continue
-            yield obj
-            n += 1
-            if limit is not None and n >= limit:
-                break
+            if isinstance(obj, dict):
+                yield tuple(obj.get(k) for k in fields)
+            continue
+        row = tuple(_materialize(doc.get(k)) for k in fields) if isinstance(doc, simdjson.Object) else None
+        del doc  # 释放文档引用，下一次 parse 才能复用 parser
+        if row is not None:
+            yield row
+
+def _materialize(v):
+    if simdjson is not None:
+        if isinstance(v, simdjson.Array):
+            return v.as_list()
+        if isinstance(v, simdjson.Object):
+            return v.as_dict()
+    return v
+
+def stream_business_lookup(path: str) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """逐行产出 (business_id, 嵌入信息)，只取构建 lookup 所需的几个字段
+
+    安装了 pysimdjson 时只把这几个字段转成 Python 值，不为每条商户记录构建完整的 dict；否则退回 stream_ndjson。
+    city / state / 类目等高度重复的字符串做驻留，相同的类目列表共用同一个 list（下游只读不改）。
+    """
+    if simdjson is None:
+        rows = (tuple(d.get(k) for k in _BIZ_FIELDS) for d in stream_ndjson(path) if isinstance(d, dict))
+    else:
+        rows = _stream_simdjson(path, _BIZ_FIELDS)
+    cats_pool: Dict[Tuple[str, ...], list] = {}
+    for bid, name, cats, city, state, stars in rows:
+        if not bid:
+            continue
+        if isinstance(cats, str):
+            cats_list = [sys.intern(c) for c in (c.strip() for c in cats.split(",")) if c]
+            cats_list = cats_pool.setdefault(tuple(cats_list), cats_list)
+        elif isinstance(cats, list):
+            cats_list = cats
+        else:
+            cats_list = []
+        yield bid, {
+            "name": name,
+            "categories": cats_list,
+            "city": _intern(city),
+            "state": _intern(state),
+            "stars": stars,
+        }
+
+def _intern(v):
+    return sys.intern(v) if type(v) is str else v
 
 def stream_ndjson_with_limit(path: str, limit: int) -> Iterable[Dict[str, Any]]:
     return stream_ndjson(path, None if not limit else limit)
 
 # ---------------------- Mongo helpers ----------------------
 
-def ensure_collection_with_validator(db, coll_name: str, json_schema: Dict[str, Any]):
-    exists = coll_name in db.list_collection_names()
-    validator = {"$jsonSchema": json_schema}
-    if not exists:
-        db.create_collection(coll_name, validator=validator)
-    else:
-        db.command("collMod", coll_name, validator=validator)
-
-def create_or_empty_collection(db, coll_name: str):
-    if coll_name in db.list_collection_names():
-        db[coll_name].delete_many({})
-    else:
+def create_or_empty_collection(db, coll_name: str, json_schema: Optional[Dict[str, Any]] = None,
+                               validation_level: str = "strict"):
+    # drop 只是一次元数据操作，比 delete_many({}) 逐条删除（写 oplog、再过一遍校验）快得多；
+    # 集合连同 $jsonSchema validator 一起重建（drop 会清掉旧集合上的 validator 和索引）
+    db.drop_collection(coll_name)
+    if json_schema is None:
         db.create_collection(coll_name)
+    else:
+        db.create_collection(coll_name, validator={"$jsonSchema": json_schema},
+                             validationLevel=validation_level)
 
 def batch_insert(coll, docs, batch_size: int):
     buf = []
@@ -65,6 +205,17 @@ def batch_insert(coll, docs, batch_size: int):
         total += len(buf)
     return total
 
+# 导入完成后才建的二级索引：边插入边维护 B-tree 会拖慢批量导入，数据就位后一次性构建更快
+REVIEW_INDEXES = (
+    IndexModel([("business_id", ASCENDING)]),
+    IndexModel([("user_id", ASCENDING)]),
+    IndexModel([("date", ASCENDING)]),
+)
+AUX_INDEXES = {
+    "businesses": (IndexModel([("business_id", ASCENDING)]),),
+    "users": (IndexModel([("user_id", ASCENDING)]),),
+}
+
 # ---------------------- JSON Schema validators ----------------------
 
 def schema_S0() -> Dict[str, Any]:
@@ -305,29 +456,86 @@ def schema_S8() -> Dict[str, Any]:
         }
     }
 
+SCHEMAS = {
+    "S0": schema_S0, "S1": schema_S1, "S2": schema_S2, "S3": schema_S3, "S4": schema_S4,
+    "S5": schema_S5, "S6": schema_S6, "S7": schema_S7, "S8": schema_S8,
+}
+
+_BSON_TO_JSON_TYPES = {
+    "string": "string", "int": "integer", "long": "integer", "double": "number",
+    "object": "object", "array": "array", "bool": "boolean", "null": "null",
+}
+
+def to_json_schema(schema: Any) -> Any:
+    """把 MongoDB $jsonSchema（bsonType）转换成标准 JSON Schema（type），供客户端校验使用"""
+    if isinstance(schema, list):
+        return [to_json_schema(x) for x in schema]
+    if not isinstance(schema, dict):
+        return schema
+    out = {}
+    for k, v in schema.items():
+        if k == "bsonType":
+            types = [v] if isinstance(v, str) else v
+            out["type"] = list(dict.fromkeys(_BSON_TO_JSON_TYPES[t] for t in types))
+        elif k == "properties":
+            out[k] = {name: to_json_schema(sub) for name, sub in v.items()}
+        else:
+            out[k] = to_json_schema(v)
+    return out
+
+def compile_validator(json_schema: Dict[str, Any]):
+    """预编译客户端校验函数：文档合法返回 True；未安装 fastjsonschema 时返回 None"""
+    if fastjsonschema is None:
+        return None
+    validate = fastjsonschema.compile(to_json_schema(json_schema))
+
+    def is_valid(doc: Dict[str, Any]) -> bool:
+        try:
+            validate(doc)
+        except fastjsonschema.JsonSchemaException:
+            return False
+        return True
+    return is_valid
+
 # ---------------------- Transforms ----------------------
 
+_YELP_DATE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", re.ASCII)
+
+@lru_cache(maxsize=1 << 16)
+def _iso_date(d: str) -> Optional[str]:
+    """日期字符串转 ISO8601，无法解析时返回 None；Yelp 的标准格式直接走 strptime，其余交给 dateutil"""
+    try:
+        if _YELP_DATE.fullmatch(d):
+            try:
+                return datetime.strptime(d, "%Y-%m-%d %H:%M:%S").isoformat()
+            except ValueError:
+                pass
+        return dateparser.parse(d).isoformat()
+    except Exception:
+        return None
+
 def s1_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(doc)
     if "stars" in out and "rating" not in out:
         out["rating"] = out.pop("stars")
-    try:
-        d = out.get("date")
-        if isinstance(d, str):
-            out["date"] = dateparser.parse(d).isoformat()
-    except Exception:
-        pass
+    d = out.get("date")
+    if isinstance(d, str):
+        iso = _iso_date(d)
+        if iso is not None:
+            out["date"] = iso
     return out
 
-SENT_SPLIT = re.compile(r'(?<=[\.\!\?。！？])\s+')
+# 句末标点后跟空白处切分；用普通 search 代替逐位置判断的 lookbehind split，group(1) 是被丢弃的空白
+SENT_SPLIT = re.compile(r'[\.\!\?。！？](\s+)')
 
 def split_title_body(text: str) -> Tuple[str, str]:
     if not text:
         return "", ""
-    parts = SENT_SPLIT.split(text.strip(), maxsplit=1)
-    if len(parts) == 1:
-        return parts[0], ""
-    return parts[0], parts[1]
+    text = text.strip()
+    m = SENT_SPLIT.search(text)
+    if m is None:
+        return text, ""
+    return text[:m.start(1)], text[m.end(1):]
 
 def s2_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(doc)
@@ -362,21 +570,19 @@ def s4_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
     except Exception:
         pass
     base = int(round(out.get("rating", 3))) if isinstance(out.get("rating"), (int, float)) else 3
-    rd = {
-        "taste": max(1, min(5, base)),
-        "service": max(1, min(5, base)),
-        "env": max(1, min(5, base))
-    }
+    v = max(1, min(5, base))
+    rd = {"taste": v, "service": v, "env": v}
     out["rating_detail"] = rd
     return out
 
 def s5_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(doc)
-    u = out.get("reactions", {}).get("useful", 0) or 0
-    f = out.get("reactions", {}).get("funny", 0) or 0
-    c = out.get("reactions", {}).get("cool", 0) or 0
-    out.setdefault("reactions", {})
-    out["reactions"]["summary"] = f"useful:{u}|funny:{f}|cool:{c}"
+    # reactions 与上一版本共享，先复制再修改
+    reactions = out["reactions"] = dict(out.get("reactions") or {})
+    u = reactions.get("useful", 0) or 0
+    f = reactions.get("funny", 0) or 0
+    c = reactions.get("cool", 0) or 0
+    reactions["summary"] = f"useful:{u}|funny:{f}|cool:{c}"
     rd = out.get("rating_detail")
     if isinstance(rd, dict) and all(k in rd for k in ("taste","service","env")):
         out["rating_avg"] = float((rd["taste"] + rd["service"] + rd["env"]) / 3.0)
@@ -387,30 +593,36 @@ def s5_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
             out["rating_avg"] = 0.0
     return out
 
+# s4 产出的 1..5 分直接查表得到 1..10 分，其他数值再现场计算
+_S6_SCALE = {v: int(max(1, min(10, round(v * 2)))) for v in range(1, 6)}
+
 def s6_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(doc)
     rd = out.get("rating_detail")
     if isinstance(rd, dict):
+        rd = dict(rd)  # 不原地修改上一版本的 rating_detail
         for k in ("taste","service","env"):
             v = rd.get(k)
             if isinstance(v, (int, float)):
-                newv = int(max(1, min(10, round(v * 2))))
+                newv = _S6_SCALE.get(v)
+                if newv is None:
+                    newv = int(max(1, min(10, round(v * 2))))
                 rd[k] = newv
         out["rating_detail"] = rd
     return out
 
 def s7_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(doc)
-    tags = out.get("reactions", {}).get("tags", [])
+    reactions = out["reactions"] = dict(out.get("reactions") or {})
+    tags = reactions.get("tags", [])
     if isinstance(tags, list):
         csv = ",".join(str(t).strip() for t in tags if str(t).strip())
     else:
         csv = ""
-    out.setdefault("reactions", {})
-    out["reactions"]["tags_csv"] = csv
+    reactions["tags_csv"] = csv
     # 可选：保留 tags 原字段以便回溯；也可以删除
-    if "tags" in out["reactions"]:
-        del out["reactions"]["tags"]
+    if "tags" in reactions:
+        del reactions["tags"]
     return out
 
 def s8_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -421,6 +633,177 @@ def s8_transform(doc: Dict[str, Any]) -> Dict[str, Any]:
 
 # ---------------------- Main ----------------------
 
+# S0 的字段及缺失时的默认值（顺序即 S0 文档的字段顺序）
+_S0_DEFAULTS = {
+    "review_id": None, "user_id": None, "business_id": None, "stars": None, "date": None,
+    "text": None, "useful": 0, "funny": 0, "cool": 0,
+}
+_S0_KEYS = tuple(_S0_DEFAULTS)
+_S0_GET = itemgetter(*_S0_KEYS)
+
+# 多进程模式下每批交给 worker 的 review 条数
+_WORKER_CHUNK = 500
+
+# S5 reactions.summary 字符串缓存及其上限
+_SUMMARY_CACHE: Dict[Tuple[int, int, int], str] = {}
+_SUMMARY_CACHE_MAX = 1 << 16
+
+# 版本顺序；S(i) 由 S(i-1) 演化得到
+VERSIONS = ("S0", "S1", "S2", "S3", "S4", "S5", "S6", "S7", "S8")
+
+def _emit(out: list, v: str, cur: Dict[str, Any], validators: Dict[str, Any], final: bool):
+    # final 表示 cur 之后不再被修改，可以直接输出，无需复制
+    doc = cur if final else dict(cur)
+    is_valid = validators[v]
+    out.append((v, doc if is_valid is None or is_valid(doc) else None))
+
+def transform_review(r: Dict[str, Any], last: int, validators: Dict[str, Any], todo,
+                     biz_lookup: Optional[Dict[str, Dict[str, Any]]]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    """让一条 review 一次走完 S0..VERSIONS[last]，返回 todo 中各版本的 (版本, 文档)；未通过客户端校验的文档为 None
+
+    结果与依次调用 s1..s8_transform 一致（含字段顺序）。S0–S2 的字段集合固定，直接由局部变量构造新 dict，
+    不做 pop；其后只维护一个 cur dict 原地演化，仅在输出某个版本时复制一次顶层，
+    嵌套的 reactions / rating_detail 在修改前先复制，已输出的版本不受影响。biz_lookup 为 None 时跳过 S3 的嵌入。
+    """
+    out = []
+    # S0 base：字段齐全时一次 itemgetter 取出全部值，缺字段时再逐个补默认值
+    try:
+        vals = _S0_GET(r)
+    except KeyError:
+        vals = tuple(r.get(k, dflt) for k, dflt in _S0_DEFAULTS.items())
+    if "S0" in todo:
+        _emit(out, "S0", dict(zip(_S0_KEYS, vals)), validators, True)
+    if last == 0:
+        return out
+    review_id, user_id, business_id, stars, date, text, useful, funny, cool = vals
+
+    # S1: stars -> rating（移到末尾），日期转 ISO8601
+    if isinstance(date, str):
+        iso = _iso_date(date)
+        if iso is not None:
+            date = iso
+    if "S1" in todo:
+        _emit(out, "S1", {
+            "review_id": review_id, "user_id": user_id, "business_id": business_id, "date": date,
+            "text": text, "useful": useful, "funny": funny, "cool": cool, "rating": stars,
+        }, validators, True)
+    if last == 1:
+        return out
+
+    # S2: text 拆出 title/body，计数字段收进 reactions
+    title, body = split_title_body(text)
+    cur = {
+        "review_id": review_id, "user_id": user_id, "business_id": business_id, "date": date,
+        "text": text, "rating": stars, "title": title or "", "body": body or "",
+        "reactions": {"useful": useful, "funny": funny, "cool": cool, "tags": []},
+    }
+    if "S2" in todo:
+        _emit(out, "S2", cur, validators, last == 2)
+    if last == 2:
+        return out
+
+    # S3: 嵌入商户信息；emb 被同一商户的所有 review 按引用共享，之后的任何版本都不得修改它
+    if biz_lookup is not None:
+        emb = biz_lookup.get(business_id)
+        if emb:
+            cur["embedded_business"] = emb
+    if "S3" in todo:
+        _emit(out, "S3", cur, validators, last == 3)
+    if last == 3:
+        return out
+
+    # S4: rating 转 float，派生 rating_detail
+    rating = stars
+    if rating is not None:
+        try:
+            rating = cur["rating"] = float(rating)
+        except Exception:
+            pass
+    base = int(round(rating)) if isinstance(rating, (int, float)) else 3
+    v = max(1, min(5, base))
+    cur["rating_detail"] = {"taste": v, "service": v, "env": v}
+    if "S4" in todo:
+        _emit(out, "S4", cur, validators, last == 4)
+    if last == 4:
+        return out
+
+    # S5: reactions.summary 与 rating_avg
+    rx = cur["reactions"]
+    u, f, c = rx["useful"] or 0, rx["funny"] or 0, rx["cool"] or 0
+    # 计数几乎都是小整数，组合有限：按 (u, f, c) 缓存整串；仅限精确 int，避免 True / 1.0 与 1 撞键
+    ints = type(u) is int and type(f) is int and type(c) is int
+    summary = _SUMMARY_CACHE.get((u, f, c)) if ints else None
+    if summary is None:
+        summary = f"useful:{u}|funny:{f}|cool:{c}"
+        if ints and len(_SUMMARY_CACHE) < _SUMMARY_CACHE_MAX:
+            _SUMMARY_CACHE[(u, f, c)] = summary
+    cur["reactions"] = {**rx, "summary": summary}
+    cur["rating_avg"] = float((v + v + v) / 3.0)
+    if "S5" in todo:
+        _emit(out, "S5", cur, validators, last == 5)
+    if last == 5:
+        return out
+
+    # S6: rating_detail 改为 1..10 分（v 总在 1..5 内，直接查表）
+    v6 = _S6_SCALE[v]
+    cur["rating_detail"] = {"taste": v6, "service": v6, "env": v6}
+    if "S6" in todo:
+        _emit(out, "S6", cur, validators, last == 6)
+    if last == 6:
+        return out
+
+    # S7: reactions.tags -> reactions.tags_csv
+    rx = cur["reactions"]
+    tags = rx["tags"]
+    csv = ",".join(str(t).strip() for t in tags if str(t).strip()) if isinstance(tags, list) else ""
+    cur["reactions"] = {"useful": rx["useful"], "funny": rx["funny"], "cool": rx["cool"],
+                        "summary": rx["summary"], "tags_csv": csv}
+    if "S7" in todo:
+        _emit(out, "S7", cur, validators, last == 7)
+    if last == 7:
+        return out
+
+    # S8: 由 user_id 派生 actors
+    cur["actors"] = [{"role": "author", "user_id": user_id}] if user_id else []
+    if "S8" in todo:
+        _emit(out, "S8", cur, validators, True)
+    return out
+
+_worker: Dict[str, Any] = {}
+
+def _init_review_worker(last: int, versions: tuple, biz_lookup: Optional[Dict[str, Dict[str, Any]]]):
+    # fork 时 biz_lookup 直接继承；校验函数是闭包无法 pickle，在各 worker 内重新编译
+    _worker["last"] = last
+    _worker["biz_lookup"] = biz_lookup
+    _worker["validators"] = {v: compile_validator(SCHEMAS[v]()) for v in versions}
+    _worker["todo"] = frozenset(versions)
+
+def _transform_batch(batch: List[Dict[str, Any]]) -> list:
+    # 在 worker 内直接编码成 BSON：主进程插入时不再逐个编码，回传的 bytes 也比嵌套 dict 好 pickle
+    w = _worker
+    return [
+        [(v, None if d is None else bson.encode(d)) for v, d in
+         transform_review(r, w["last"], w["validators"], w["todo"], w["biz_lookup"])]
+        for r in batch
+    ]
+
+def parallel_transform(pool, reviews: Iterable[Dict[str, Any]], max_pending: int) -> Iterable[list]:
+    """按输入顺序产出每条 review 的 transform_review 结果（文档为已编码的 RawBSONDocument）；
+    最多保留 max_pending 个未完成批次，避免读取端跑得过远
+    """
+    it = iter(reviews)
+    pending = deque()
+    while True:
+        while len(pending) < max_pending:
+            batch = list(islice(it, _WORKER_CHUNK))
+            if not batch:
+                break
+            pending.append(pool.apply_async(_transform_batch, (batch,)))
+        if not pending:
+            return
+        for outs in pending.popleft().get():
+            yield [(v, raw if raw is None else RawBSONDocument(raw)) for v, raw in outs]
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--mongo-uri", required=True)
@@ -428,7 +811,11 @@ def main():
     ap.add_argument("--review", required=True, help="Path to yelp_academic_dataset_review.json")
     ap.add_argument("--business", required=True, help="Path to yelp_academic_dataset_business.json")
     ap.add_argument("--user", required=True, help="Path to yelp_academic_dataset_user.json")
-    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--batch-size", type=int, default=5000,
+                    help="Docs per insert_many call; reviews are flushed every batch-size rows")
+    ap.add_argument("--unacked-writes", action="store_true",
+                    help="Bulk load with write concern w=0 (no server acknowledgement; "
+                         "rejected docs are not reported and counts are client-side)")
     ap.add_argument("--limit", type=int, default=None, help="Limit number of reviews (read-side)")
     ap.add_argument("--versions", default="S0,S1,S2,S3,S4,S5,S6,S7,S8",
                     help="Comma separated review versions to build, e.g. S0,S1,S2")
@@ -436,6 +823,8 @@ def main():
                     help="Skip loading businesses/users and skip S3 embedding")
     ap.add_argument("--aux-limit", type=int, default=0,
                     help="Limit rows for businesses/users (0 = no limit)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Worker processes for the review transforms (1 = run in-process)")
     ap.add_argument("--per-version-limit", type=int, default=100000,
                     help="Max documents per version collection (cap).")
     args = ap.parse_args()
@@ -449,156 +838,149 @@ def main():
     client = MongoClient(args.mongo_uri)
     db = client[args.db]
 
-    # Prepare validators and empty collections
-    if "S0" in versions_set: ensure_collection_with_validator(db, "reviews_S0", schema_S0())
-    if "S1" in versions_set: ensure_collection_with_validator(db, "reviews_S1", schema_S1())
-    if "S2" in versions_set: ensure_collection_with_validator(db, "reviews_S2", schema_S2())
-    if "S3" in versions_set: ensure_collection_with_validator(db, "reviews_S3", schema_S3())
-    if "S4" in versions_set: ensure_collection_with_validator(db, "reviews_S4", schema_S4())
-    if "S5" in versions_set: ensure_collection_with_validator(db, "reviews_S5", schema_S5())
-    if "S6" in versions_set: ensure_collection_with_validator(db, "reviews_S6", schema_S6())
-    if "S7" in versions_set: ensure_collection_with_validator(db, "reviews_S7", schema_S7())
-    if "S8" in versions_set: ensure_collection_with_validator(db, "reviews_S8", schema_S8())
-
-    for c in ("S0","S1","S2","S3","S4","S5","S6","S7","S8"):
-        if c in versions_set:
-            create_or_empty_collection(db, f"reviews_{c}")
-
-    # Aux collections and embedding lookup
-    biz_lookup: Dict[str, Dict[str, Any]] = {}
-    if not args.skip_aux:
-        if "businesses" not in db.list_collection_names():
-            db.create_collection("businesses")
-        else:
-            db["businesses"].delete_many({})
-        if "users" not in db.list_collection_names():
-            db.create_collection("users")
-        else:
-            db["users"].delete_many({})
-
-        print("[*] Loading businesses...")
-        biz_count = batch_insert(db["businesses"],
-                                 stream_ndjson_with_limit(args.business, args.aux_limit),
-                                 args.batch_size)
-        print(f"[OK] businesses inserted: {biz_count}")
-
-        print("[*] Loading users...")
-        user_count = batch_insert(db["users"],
-                                  stream_ndjson_with_limit(args.user, args.aux_limit),
-                                  args.batch_size)
-        print(f"[OK] users inserted: {user_count}")
-
-        if "S3" in versions_set or "S6" in versions_set:
-            print("[*] Building business lookup for embedding (S3/S6)...")
-            for doc in stream_ndjson(args.business):
-                bid = doc.get("business_id")
-                if not bid:
-                    continue
-                cats = doc.get("categories")
-                if isinstance(cats, str):
-                    cats_list = [c.strip() for c in cats.split(",") if c.strip()]
-                elif isinstance(cats, list):
-                    cats_list = cats
-                else:
-                    cats_list = []
-                biz_lookup[bid] = {
-                    "name": doc.get("name"),
-                    "categories": cats_list,
-                    "city": doc.get("city"),
-                    "state": doc.get("state"),
-                    "stars": doc.get("stars"),
-                }
-            print(f"[OK] business lookup size: {len(biz_lookup)}")
-
-    # Handles
-    colls = {v: db[f"reviews_{v}"] for v in versions_set}
-    buffers: Dict[str, list] = {v: [] for v in versions_set}
-    inserted: Dict[str, int] = {v: 0 for v in versions_set}
-    bsize = args.batch_size
-
-    print("[*] Processing reviews with per-version cap =", args.per_version_limit)
-    processed = 0
-
-    for r in stream_ndjson(args.review, limit=args.limit):
-        if all(inserted[v] >= args.per_version_limit for v in versions_set):
-            break
-
-        # S0 base
-        d0 = {
-            "review_id": r.get("review_id"),
-            "user_id": r.get("user_id"),
-            "business_id": r.get("business_id"),
-            "stars": r.get("stars"),
-            "date": r.get("date"),
-            "text": r.get("text"),
-            "useful": r.get("useful", 0),
-            "funny": r.get("funny", 0),
-            "cool": r.get("cool", 0),
-        }
-
-        if "S0" in versions_set and inserted["S0"] < args.per_version_limit:
-            buffers["S0"].append(d0.copy())
-
-        d1 = s1_transform(d0)
-        if "S1" in versions_set and inserted["S1"] < args.per_version_limit:
-            buffers["S1"].append(d1.copy())
-
-        d2 = s2_transform(d1)
-        if "S2" in versions_set and inserted["S2"] < args.per_version_limit:
-            buffers["S2"].append(d2.copy())
-
-        d3 = s3_transform(d2, biz_lookup) if not args.skip_aux else d2
-        if "S3" in versions_set and inserted["S3"] < args.per_version_limit:
-            buffers["S3"].append(d3.copy())
-
-        d4 = s4_transform(d3)
-        if "S4" in versions_set and inserted["S4"] < args.per_version_limit:
-            buffers["S4"].append(d4.copy())
-
-        d5 = s5_transform(d4)
-        if "S5" in versions_set and inserted["S5"] < args.per_version_limit:
-            buffers["S5"].append(d5.copy())
-
-        d6 = s6_transform(d5)
-        if "S6" in versions_set and inserted["S6"] < args.per_version_limit:
-            buffers["S6"].append(d6.copy())
-
-        d7 = s7_transform(d6)
-        if "S7" in versions_set and inserted["S7"] < args.per_version_limit:
-            buffers["S7"].append(d7.copy())
+    def loader(coll_name: str):
+        # 批量导入用的集合句柄；--unacked-writes 时不等待服务端确认，省去每批一次往返
+        coll = db[coll_name]
+        if args.unacked_writes:
+            coll = coll.with_options(write_concern=WriteConcern(w=0))
+        return coll
 
-        d8 = s8_transform(d7)
-        if "S8" in versions_set and inserted["S8"] < args.per_version_limit:
-            buffers["S8"].append(d8.copy())
-
-        processed += 1
-        if processed % (bsize*10) == 0:
+    # Prepare validators and empty collections
+    # 装有 fastjsonschema 时在客户端用预编译的校验函数过滤文档，导入期间关闭服务端校验，结束后再恢复 strict
+    validators = {}
+    relaxed: List[str] = []  # 导入期间关闭了服务端校验的集合
+    try:
+        for v in SCHEMAS:
+            if v not in versions_set:
+                continue
+            validators[v] = compile_validator(SCHEMAS[v]())
+            level = "strict" if validators[v] is None else "off"
+            create_or_empty_collection(db, f"reviews_{v}", SCHEMAS[v](), validation_level=level)
+            if level == "off":
+                relaxed.append(f"reviews_{v}")
+
+        # Aux collections and embedding lookup
+        biz_lookup: Dict[str, Dict[str, Any]] = {}
+        if not args.skip_aux:
+            create_or_empty_collection(db, "businesses")
+            create_or_empty_collection(db, "users")
+
+            print("[*] Loading businesses...")
+            biz_count = batch_insert(loader("businesses"),
+                                     stream_ndjson_with_limit(args.business, args.aux_limit),
+                                     args.batch_size)
+            print(f"[OK] businesses inserted: {biz_count}")
+
+            print("[*] Loading users...")
+            user_count = batch_insert(loader("users"),
+                                      stream_ndjson_with_limit(args.user, args.aux_limit),
+                                      args.batch_size)
+            print(f"[OK] users inserted: {user_count}")
+
+            for name, indexes in AUX_INDEXES.items():
+                db[name].create_indexes(list(indexes))
+
+            if "S3" in versions_set or "S6" in versions_set:
+                print("[*] Building business lookup for embedding (S3/S6)...")
+                for bid, emb in stream_business_lookup(args.business):
+                    biz_lookup[bid] = emb
+                print(f"[OK] business lookup size: {len(biz_lookup)}")
+
+        # Handles
+        colls = {v: loader(f"reviews_{v}") for v in versions_set}
+        buffers: Dict[str, list] = {v: [] for v in versions_set}
+        inserted: Dict[str, int] = {v: 0 for v in versions_set}
+        rejected: Dict[str, int] = {v: 0 for v in versions_set}
+        bsize = args.batch_size
+        cap = args.per_version_limit
+
+        lookup = None if args.skip_aux else biz_lookup
+
+        def open_versions():
+            # 仍未达到上限的版本，以及需要演化到的最后一个版本下标（全部达到上限时为 -1）
+            todo = {v for v in versions_set if inserted[v] < cap}
+            last = max((i for i, v in enumerate(VERSIONS) if v in todo), default=-1)
+            return todo, last
+
+        todo, last = open_versions()
+
+        print("[*] Processing reviews with per-version cap =", args.per_version_limit)
+        processed = 0
+
+        # insert_many 放到后台线程执行（pymongo 等待网络时释放 GIL），与下一轮 transform 重叠；
+        # 每个版本一个线程，最多保留一轮未完成的插入，下一次 flush 前先等它完成并抛出其中的异常
+        insert_pool = ThreadPoolExecutor(max_workers=max(1, len(versions_set)))
+        pending_inserts = []
+
+        def flush():
+            nonlocal pending_inserts
+            for fut in pending_inserts:
+                fut.result()
+            pending_inserts = []
             for v in versions_set:
                 if buffers[v]:
-                    remain = args.per_version_limit - inserted[v]
+                    remain = cap - inserted[v]
                     if remain > 0:
                         batch = buffers[v][:remain]
-                        if batch:
-                            colls[v].insert_many(batch, ordered=False)
-                            inserted[v] += len(batch)
+                        pending_inserts.append(insert_pool.submit(colls[v].insert_many, batch, ordered=False))
+                        inserted[v] += len(batch)
                     buffers[v].clear()
-            print(f"  .. processed {processed} | per-version inserted: {inserted}")
-            if all(inserted[v] >= args.per_version_limit for v in versions_set):
-                break
 
-    # final flush
-    for v in versions_set:
-        if buffers[v] and inserted[v] < args.per_version_limit:
-            remain = args.per_version_limit - inserted[v]
-            batch = buffers[v][:remain]
-            if batch:
-                colls[v].insert_many(batch, ordered=False)
-                inserted[v] += len(batch)
-            buffers[v].clear()
+        reviews = stream_ndjson(args.review, limit=args.limit)
+        pool = None
+        if args.workers > 1:
+            # worker 只知道启动时的 last / todo，已达上限的版本由下面的循环丢弃
+            pool = Pool(args.workers, initializer=_init_review_worker, initargs=(last, tuple(todo), lookup))
+            results = parallel_transform(pool, reviews, max_pending=2 * args.workers)
+        else:
+            def serial_results():
+                # 每次读取当前的 last / todo：后面的版本都已达到上限时，不再继续演化
+                for r in reviews:
+                    yield transform_review(r, last, validators, todo, lookup)
+            results = serial_results()
+
+        try:
+            for outs in results:
+                if last < 0:
+                    break
+
+                for v, d in outs:
+                    if v not in todo:
+                        continue
+                    if d is None:
+                        rejected[v] += 1
+                    else:
+                        buffers[v].append(d)
+
+                processed += 1
+                if processed % bsize == 0:
+                    flush()
+                    print(f"  .. processed {processed} | per-version inserted: {inserted}")
+                    todo, last = open_versions()
+                    if last < 0:
+                        break
+
+            # final flush
+            flush()
+            for fut in pending_inserts:
+                fut.result()
+
+            print("[*] Building review indexes...")
+            for v in versions_set:
+                colls[v].create_indexes(list(REVIEW_INDEXES))
+        finally:
+            if pool is not None:
+                pool.terminate()
+            insert_pool.shutdown(wait=True)
+    finally:
+        # 不论正常结束还是中途出错 / Ctrl-C，都把这些集合的服务端校验恢复成 strict
+        for name in relaxed:
+            db.command("collMod", name, validationLevel="strict")
 
     print(f"[DONE] processed reviews: {processed}")
     for v in sorted(versions_set):
-        print(f"  - reviews_{v}: {inserted[v]} docs (cap {args.per_version_limit})")
+        extra = f", rejected by validator {rejected[v]}" if rejected[v] else ""
+        print(f"  - reviews_{v}: {inserted[v]} docs (cap {args.per_version_limit}){extra}")
 
 if __name__ == "__main__":
     main()
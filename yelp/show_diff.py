@@ -7,77 +7,176 @@ schema_diff.py
   - operations_<A>_to_<B>.json  （模式演化操作序列，使用你的最终版操作命名）
   - diff_tree_<A>_to_<B>.mmd    （Mermaid 树图，新增=绿、删除=红、修改=黄）
   - tree_<A>.mmd / tree_<B>.mmd （各自版本的树）
+
+可选：pip install orjson   # 加速 schema 读取与操作序列写出
+可选：pip install mypy && mypyc show_diff.py   # 按类型注解 AOT 编译成 C 扩展，
+      之后用 python -c "import show_diff; show_diff.main()" A.json B.json 调用编译版（直接运行 .py 仍是纯 Python）
 """
 
-import json, sys, os, copy
+import json, sys, os
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
 
 # --------------------- 解析 & 树展开 ---------------------
 
-def load_schema(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+# 类型别名：schema 节点、path->node 索引、path->(父路径, 末段名, 节点 id)、单条演化操作
+Node = Dict[str, Any]
+Index = Dict[str, Node]
+Meta = Dict[str, Tuple[str, str, str]]
+Op = Dict[str, Any]
+
+def load_schema(path: str) -> Any:
+    """读取 schema：优先 orjson（直接解析 bytes），解析失败时再交给标准库（兼容 NaN 等扩展写法）"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data.decode("utf-8"))
+
+def dump_ops(ops: List[Op], path: str) -> None:
+    """写出操作序列（2 空格缩进、保留非 ASCII 字符）；orjson 不支持的值（如超 64 位整数）退回标准库"""
+    if orjson is not None:
+        try:
+            data = orjson.dumps(ops, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            data = None
+        if data is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(ops, f, ensure_ascii=False, indent=2)
 
-def norm_type(t):
-    if isinstance(t, list): return tuple(sorted(t))
+@lru_cache(maxsize=256)
+def _sorted_types(t: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    return tuple(sorted(t))
+
+def norm_type(t: Any) -> Any:
+    # 联合类型（list）规范成排序元组：同一组合在 schema 里反复出现，排序结果按原顺序缓存；
+    # 保持元组而非 frozenset，ChangeType 的 from/to 才能照旧序列化成有序 JSON 数组
+    if isinstance(t, list):
+        try:
+            return _sorted_types(tuple(t))
+        except TypeError:  # 元素不可哈希时不走缓存
+            return tuple(sorted(t))
     return t
 
-def node_signature(node):
-    """用于相似度匹配的签名：类型、min/max、enum、必填子字段名集合等"""
-    sig = {
-        "bsonType": norm_type(node.get("bsonType")),
-        "minimum": node.get("minimum"),
-        "maximum": node.get("maximum"),
-        "enum_sz": len(node.get("enum", [])) if node.get("enum") else 0,
-        "has_items": "items" in node,
-    }
+# 节点签名：固定字段的元组，比逐个 dict 查键便宜；不适用的字段为 None（如非 object 节点的 child_keys）
+class Sig(NamedTuple):
+    bsonType: Any
+    minimum: Any
+    maximum: Any
+    enum_sz: int
+    has_items: bool
+    itemsType: Any
+    child_keys: Optional[FrozenSet[str]]
+    required_set: Optional[Tuple[str, ...]]
+
+_sig_cache: Dict[int, Tuple[Node, Sig]] = {}  # id(node) -> (node, sig)；保留 node 引用，避免 id 被回收复用后命中旧签名
+
+def node_signature(node: Node) -> Sig:
+    """用于相似度匹配的签名：类型、min/max、enum、必填子字段名集合等（按节点缓存，每个节点只签名一次）"""
+    hit = _sig_cache.get(id(node))
+    if hit is not None and hit[0] is node:
+        return hit[1]
+    bt = norm_type(node.get("bsonType"))
+    items_t = child_keys = required_set = None
     if "items" in node and isinstance(node["items"], dict):
-        sig["itemsType"] = norm_type(node["items"].get("bsonType"))
+        items_t = norm_type(node["items"].get("bsonType"))
     # 子属性名（不含类型）用于衡量对象结构相近性
-    if node.get("bsonType") == "object":
+    if bt == "object":
         props = node.get("properties", {})
-        sig["child_keys"] = tuple(sorted(props.keys()))
+        child_keys = frozenset(props)  # 只用于 jaccard，直接存集合免得每次比较都重建
         req = node.get("required", [])
-        sig["required_set"] = tuple(sorted(req))
+        required_set = tuple(sorted(req))
+    sig = Sig(bt, node.get("minimum"), node.get("maximum"),
+              len(node.get("enum", [])) if node.get("enum") else 0,
+              "items" in node, items_t, child_keys, required_set)
+    _sig_cache[id(node)] = (node, sig)
     return sig
 
-def jaccard(a, b):
-    a = set(a); b = set(b)
-    if not a and not b: return 1.0
-    return len(a & b) / max(1, len(a | b))
+def jaccard(a: Iterable[str], b: Iterable[str]) -> float:
+    if not isinstance(a, frozenset): a = frozenset(a)
+    if not isinstance(b, frozenset): b = frozenset(b)
+    inter = len(a & b)
+    uni = len(a) + len(b) - inter
+    return inter / uni if uni else 1.0
 
-def sim(sig1, sig2):
+def sim(sig1: Sig, sig2: Sig) -> float:
     """粗略相似度：类型一致加分；子字段集合 jaccard；数值约束接近；"""
-    s = 0.0
-    if sig1.get("bsonType") == sig2.get("bsonType"): s += 0.4
-    if "child_keys" in sig1 and "child_keys" in sig2:
-        s += 0.3 * jaccard(sig1["child_keys"], sig2["child_keys"])
-    if sig1.get("enum_sz") == sig2.get("enum_sz"): s += 0.1
-    if sig1.get("has_items") == sig2.get("has_items"): s += 0.1
-    if sig1.get("itemsType") == sig2.get("itemsType"): s += 0.1
+    # 类型不一致时其余各项合计最多 0.3（child_keys 只在双方都是 object 时计分），达不到匹配阈值，直接返回 0
+    if sig1.bsonType != sig2.bsonType: return 0.0
+    s = 0.4
+    if sig1.child_keys is not None and sig2.child_keys is not None:
+        s += 0.3 * jaccard(sig1.child_keys, sig2.child_keys)
+    if sig1.enum_sz == sig2.enum_sz: s += 0.1
+    if sig1.has_items == sig2.has_items: s += 0.1
+    if sig1.itemsType == sig2.itemsType: s += 0.1
     return s
 
-def walk(schema, root_name):
+def _nid(p: str) -> str:
+    """路径 -> Mermaid 节点 id"""
+    return p.replace(".","_").replace("[]","Arr")
+
+def _split_meta(p: str) -> Tuple[str, str, str]:
+    parent, _, name = p.rpartition(".")
+    return (parent, name, _nid(p))
+
+_meta_cache: Dict[int, Tuple[Index, Meta]] = {}  # id(idx) -> (idx, meta)；walk 边遍历边登记，path_meta 直接复用
+
+def walk(schema: Node, root_name: str) -> Index:
     """把 JSON Schema 展开成 path->node 的字典；array 用 path[] 表示"""
-    idx = {}
-    def _walk(prefix, node):
+    # 显式栈先序遍历（子节点逆序入栈，顺序与递归一致），深层 schema 也不会触发 RecursionError；
+    # 入栈时父节点已知，顺手把子路径的 (父路径, 末段名, 节点 id) 由父节点的结果拼出来
+    idx: Index = {}
+    meta: Meta = {}
+    stack: List[Tuple[str, Node, Tuple[str, str, str]]] = [(root_name, schema, _split_meta(root_name))]
+    while stack:
+        prefix, node, m = stack.pop()
+        prefix = sys.intern(prefix)  # 两版共有路径成为同一对象，集合运算/字典查找走指针相等快路径
         idx[prefix] = node
+        meta[prefix] = m
         bt = node.get("bsonType")
         if bt == "object":
             props = node.get("properties", {})
+            nid = m[2]
+            children = []
             for k, v in props.items():
-                _walk(f"{prefix}.{k}", v)
+                p = f"{prefix}.{k}"
+                # 字段名自身带 "." 时末段/父路径按整条路径重新拆分
+                children.append((p, v, _split_meta(p) if "." in k else (prefix, k, f"{nid}_{_nid(k)}")))
+            children.reverse()
+            stack.extend(children)
         elif bt == "array":
             items = node.get("items", {})
             if isinstance(items, dict):
-                _walk(f"{prefix}[]", items)
-    _walk(root_name, schema)
+                # path[] 与 path 同父，末段名多一个 []
+                stack.append((f"{prefix}[]", items, (m[0], m[1] + "[]", m[2] + "Arr")))
+    _meta_cache[id(idx)] = (idx, meta)
     return idx
 
+def path_meta(idx: Index) -> Meta:
+    """每条路径预先拆好 (父路径, 末段名, Mermaid 节点 id)，避免在各处反复 split/replace；walk 生成的索引直接取现成结果"""
+    hit = _meta_cache.get(id(idx))
+    if hit is not None and hit[0] is idx:
+        return hit[1]
+    return {p: _split_meta(p) for p in idx}
+
 # --------------------- Diff 核心 ---------------------
 
-def compute_required_ops(old_node, new_node, path):
-    ops = []
+def compute_required_ops(old_node: Node, new_node: Node, path: str, ops: Optional[List[Op]] = None) -> List[Op]:
+    """传入 ops 时直接追加到该列表（diff 主循环用），省去每条公共路径一个临时列表"""
+    if ops is None: ops = []
     if not (old_node and new_node): return ops
     old_req = set(old_node.get("required", []))
     new_req = set(new_node.get("required", []))
@@ -87,8 +186,8 @@ def compute_required_ops(old_node, new_node, path):
         ops.append({"op":"DropRequired","path": f"{path}.{r}"})
     return ops
 
-def constraint_ops(old_node, new_node, path):
-    ops = []
+def constraint_ops(old_node: Node, new_node: Node, path: str, ops: Optional[List[Op]] = None) -> List[Op]:
+    if ops is None: ops = []
     # range
     omin, omax = old_node.get("minimum"), old_node.get("maximum")
     nmin, nmax = new_node.get("minimum"), new_node.get("maximum")
@@ -110,7 +209,7 @@ def constraint_ops(old_node, new_node, path):
         ops.append({"op":"ModifyEnum","path":path,"from_sz":len(oenum),"to_sz":len(nenum)})
     return ops
 
-def type_change_op(old_node, new_node, path):
+def type_change_op(old_node: Node, new_node: Node, path: str) -> Optional[Op]:
     ot = norm_type(old_node.get("bsonType"))
     nt = norm_type(new_node.get("bsonType"))
     if ot != nt:
@@ -120,29 +219,76 @@ def type_change_op(old_node, new_node, path):
         if (nt == "array" and ot in ("string","object","double","int","long")):
             return {"op":"ToArray","path":path}
         return {"op":"ChangeType","path":path,"from":ot,"to":nt}
-
-def detect_moves_and_renames(removed, added, old_idx, new_idx):
+    return None
+
+def _block_key(t: Any) -> Any:
+    """类型分桶键：bsonType 通常是字符串或（已排序的）元组；其他不可哈希的 JSON 值转成规范化字符串"""
+    try:
+        hash(t)
+        return t
+    except TypeError:
+        return json.dumps(t, sort_keys=True)
+
+def detect_moves_and_renames(removed: List[str], added: List[str], old_idx: Index, new_idx: Index,
+                             old_meta: Optional[Meta] = None, new_meta: Optional[Meta] = None
+                             ) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], Set[str], Set[str]]:
     """基于签名相似度 + 父节点关系，推断 Move/Rename"""
+    if old_meta is None: old_meta = path_meta(old_idx)
+    if new_meta is None: new_meta = path_meta(new_idx)
     renames = []
     moves = []
-    pairs = []  # (old_path, new_path, score)
-    sig_old = {p:node_signature(old_idx[p]) for p in removed}
-    sig_new = {p:node_signature(new_idx[p]) for p in added}
+    pairs: List[Tuple[str, str, float]] = []  # (old_path, new_path, score)
+    # 按类型分桶：类型不同时 sim 最多 0.3（child_keys 只在双方都是 object 时计分），不可能达到阈值，
+    # 因此只需比较同类型的候选；桶内保持 added 的原顺序，配对顺序与全量两两比较一致
+    buckets: Dict[Any, List[str]] = defaultdict(list)
+    for pn in added:
+        buckets[_block_key(node_signature(new_idx[pn]).bsonType)].append(pn)
+    # 非 object 桶里没有 child_keys，sim 只取决于 (enum_sz, has_items, itemsType)：
+    # 桶内再按这三项分组，同组候选得分相同，每个删除路径对每组只算一次 sim
+    groups: Dict[Any, Dict[Tuple[int, bool, Any], List[Tuple[int, str]]]] = {}
+    for key, pns in buckets.items():
+        if key == "object": continue
+        sub: Dict[Tuple[int, bool, Any], List[Tuple[int, str]]] = {}
+        for pos, pn in enumerate(pns):
+            sig = node_signature(new_idx[pn])
+            sub.setdefault((sig.enum_sz, sig.has_items, _block_key(sig.itemsType)), []).append((pos, pn))
+        groups[key] = sub
     for po in removed:
-        for pn in added:
-            s = sim(sig_old[po], sig_new[pn])
-            # 同父不同名 ⇒ 候选重命名；不同父同名 ⇒ 候选移动；都不同 ⇒ move+rename 候选
-            if s >= 0.6:
-                pairs.append((po, pn, s))
+        so = node_signature(old_idx[po])
+        key = _block_key(so.bsonType)
+        g = groups.get(key)
+        if g is None:
+            # object 桶：双方类型相同且都有 child_keys，sim/jaccard 在这里展开成内联计算（加法顺序与 sim 一致，得分逐位相同）
+            ck, esz, hi, it = so.child_keys, so.enum_sz, so.has_items, so.itemsType
+            nck = len(ck) if ck is not None else 0
+            for pn in buckets.get(key, ()):
+                sn = node_signature(new_idx[pn])
+                s = 0.4
+                if ck is not None and sn.child_keys is not None:
+                    inter = len(ck & sn.child_keys)
+                    uni = nck + len(sn.child_keys) - inter
+                    s += 0.3 * (inter / uni if uni else 1.0)
+                if esz == sn.enum_sz: s += 0.1
+                if hi == sn.has_items: s += 0.1
+                if it == sn.itemsType: s += 0.1
+                # 同父不同名 ⇒ 候选重命名；不同父同名 ⇒ 候选移动；都不同 ⇒ move+rename 候选
+                if s >= 0.6:
+                    pairs.append((po, pn, s))
+        else:
+            hits: List[Tuple[int, str, float]] = []
+            for members in g.values():
+                s = sim(so, node_signature(new_idx[members[0][1]]))
+                if s >= 0.6:
+                    hits.extend((pos, pn, s) for pos, pn in members)
+            hits.sort()  # 按桶内位置恢复 added 顺序，保证同分排序结果不变
+            pairs.extend((po, pn, s) for _, pn, s in hits)
     pairs.sort(key=lambda x: x[2], reverse=True)
     used_old, used_new = set(), set()
     for po, pn, s in pairs:
         if po in used_old or pn in used_new:
             continue
-        old_parent = ".".join(po.split(".")[:-1])
-        new_parent = ".".join(pn.split(".")[:-1])
-        old_name = po.split(".")[-1]
-        new_name = pn.split(".")[-1]
+        old_parent, old_name, _ = old_meta[po]
+        new_parent, new_name, _ = new_meta[pn]
         if old_parent == new_parent and old_name != new_name:
             renames.append((po, pn))
         elif old_parent != new_parent and old_name == new_name:
@@ -154,37 +300,35 @@ def detect_moves_and_renames(removed, added, old_idx, new_idx):
         used_old.add(po); used_new.add(pn)
     return renames, moves, used_old, used_new
 
-def diff(old_schema_path, new_schema_path):
+def diff(old_schema_path: str, new_schema_path: str) -> Tuple[List[Op], Index, Index, str, str]:
     baseA = os.path.basename(old_schema_path).replace("_schema.json","")
     baseB = os.path.basename(new_schema_path).replace("_schema.json","")
     A = load_schema(old_schema_path)
     B = load_schema(new_schema_path)
+    _sig_cache.clear()  # 签名/路径拆分缓存只在一次 diff 内有效，防止跨调用无限增长
+    _meta_cache.clear()
     idxA = walk(A, baseA)
     idxB = walk(B, baseB)
 
-    pathsA = set(idxA.keys())
-    pathsB = set(idxB.keys())
-
-    # 纯集合差
-    removed = sorted(p for p in (pathsA - pathsB) if not p.endswith("[]"))
-    added   = sorted(p for p in (pathsB - pathsA) if not p.endswith("[]"))
-    common  = sorted(pathsA & pathsB)
+    pathsA = idxA.keys()
+    pathsB = idxB.keys()
 
-    ops = []
+    # 纯集合差；公共路径直接带上两版节点，后面的循环不用再查字典
+    removed = sorted(p for p in (pathsA - pathsB) if p[-2:] != "[]")
+    added   = sorted(p for p in (pathsB - pathsA) if p[-2:] != "[]")
+    common  = [(p, idxA[p], idxB[p]) for p in sorted(pathsA & pathsB)]
 
     # rename / move 识别（在“字段删除/新增”之间匹配）
-    renames, moves, used_old, used_new = detect_moves_and_renames(removed, added, idxA, idxB)
+    renames, moves, used_old, used_new = detect_moves_and_renames(removed, added, idxA, idxB,
+                                                                  path_meta(idxA), path_meta(idxB))
 
     # 剔除已被识别为 move/rename 的出入
     removed_eff = [p for p in removed if p not in used_old]
     added_eff   = [p for p in added   if p not in used_new]
 
     # 生成 Drop / Add
-    for p in removed_eff:
-        ops.append({"op":"DropField","path":p})
-    for p in added_eff:
-        node = idxB[p]
-        ops.append({"op":"AddField","path":p, "dtype":node.get("bsonType")})
+    ops: List[Op] = [{"op":"DropField","path":p} for p in removed_eff]
+    ops += [{"op":"AddField","path":p, "dtype":idxB[p].get("bsonType")} for p in added_eff]
 
     # 生成 Rename / Move
     for po, pn in renames:
@@ -194,95 +338,107 @@ def diff(old_schema_path, new_schema_path):
             ops.append({"op":"MoveField","from":po, "to":pn})
 
     # 公共路径上检查类型 & 约束变化；并检查 object 的 required 差异
-    for p in common:
-        a = idxA[p]; b = idxB[p]
+    for p, a, b in common:
         if a.get("bsonType") and b.get("bsonType"):
             tchg = type_change_op(a, b, p)
             if tchg: ops.append(tchg)
-        ops += constraint_ops(a, b, p)
+        constraint_ops(a, b, p, ops)
         # object 的 required 列表 diff
         if a.get("bsonType") == "object" and b.get("bsonType") == "object":
-            ops += compute_required_ops(a, b, p)
+            compute_required_ops(a, b, p, ops)
 
     return ops, idxA, idxB, baseA, baseB
 
 # --------------------- Mermaid 树渲染 ---------------------
 
-def mmd_tree(idx, title):
-    """把一个 schema 索引渲染为树（Mermaid flowchart TD）"""
-    lines = ["flowchart TD", f'classDef added fill:#e6ffed,stroke:#2ecc71,stroke-width:1px;'
-                             f'classDef removed fill:#ffecec,stroke:#e74c3c,stroke-width:1px;'
-                             f'classDef changed fill:#fffbe6,stroke:#f1c40f,stroke-width:1px;']
+def _emit_lines(lines: Iterable[str], out: Optional[TextIO]) -> Optional[str]:
+    """out 为 None 时拼成字符串返回；否则逐行写入文件对象（行间 \\n，末尾不加换行，与拼接结果一致）"""
+    if out is None:
+        return "\n".join(lines)
+    w = out.write
+    it = iter(lines)
+    for line in it:
+        w(line)
+        break
+    for line in it:
+        w("\n" + line)
+    return None
+
+def mmd_tree(idx: Index, title: str, meta: Optional[Meta] = None, out: Optional[TextIO] = None) -> Optional[str]:
+    """把一个 schema 索引渲染为树（Mermaid flowchart TD）；给出 out 时直接流式写入文件"""
+    if meta is None: meta = path_meta(idx)
+    return _emit_lines(_mmd_tree_lines(idx, title, meta), out)
+
+def _mmd_tree_lines(idx: Index, title: str, meta: Meta) -> Iterator[str]:
+    yield "flowchart TD"
+    yield f"%% {title}"
+    yield (f'classDef added fill:#e6ffed,stroke:#2ecc71,stroke-width:1px;'
+           f'classDef removed fill:#ffecec,stroke:#e74c3c,stroke-width:1px;'
+           f'classDef changed fill:#fffbe6,stroke:#f1c40f,stroke-width:1px;')
     # 建树关系
-    nodes = set(idx.keys())
-    for p in sorted(nodes):
-        nid = p.replace(".","_").replace("[]","Arr")
-        label = p.split(".")[-1]
-        bt = idx[p].get("bsonType")
-        lines.append(f'{nid}["{label}\\n({bt})"]')
+    for p in sorted(idx):
+        parent, label, nid = meta[p]
+        yield f'{nid}["{label}\\n({idx[p].get("bsonType")})"]'
         if "." in p:
-            parent = ".".join(p.split(".")[:-1])
-            pid = parent.replace(".","_").replace("[]","Arr")
-            lines.append(f"{pid} --> {nid}")
-    lines.insert(1, f"%% {title}")
-    return "\n".join(lines)
-
-def mmd_diff_tree(idxA, idxB, baseA, baseB, ops):
-    """根据 ops 给节点上色：Add=绿、Drop=红、Change=黄"""
-    # 标记
-    add_nodes = set()
-    drop_nodes = set()
-    chg_nodes = set()
+            pid = meta[parent][2] if parent in meta else _nid(parent)
+            yield f"{pid} --> {nid}"
+
+# 在 diff 树里标黄（changed）的操作类型
+_CHG_OPS = frozenset({"RenameField","MoveField","ChangeType","ToArray","ToScalar",
+                      "AddRange","ModifyRange","DropRange",
+                      "AddEnum","ModifyEnum","DropEnum",
+                      "AddRequired","DropRequired","AddItemsConstraint","ModifyItemsConstraint","DropItemsConstraint"})
+
+def mmd_diff_tree(idxA: Index, idxB: Index, baseA: str, baseB: str, ops: List[Op],
+                  meta: Optional[Meta] = None, out: Optional[TextIO] = None) -> Optional[str]:
+    """根据 ops 给节点上色：Add=绿、Drop=红、Change=黄；meta 为两版路径合并后的 path_meta；给出 out 时直接流式写入文件"""
+    if meta is None: meta = {**path_meta(idxA), **path_meta(idxB)}
+    return _emit_lines(_mmd_diff_tree_lines(idxA, idxB, baseA, baseB, ops, meta), out)
+
+def _mmd_diff_tree_lines(idxA: Index, idxB: Index, baseA: str, baseB: str, ops: List[Op], meta: Meta) -> Iterator[str]:
+    # 标记：每个节点只挂一个 class，同一节点命中多类时按 removed > added > changed 取优先级高的
+    status: Dict[str, str] = {}
     for op in ops:
         if op["op"] == "AddField":
-            add_nodes.add(op["path"])
+            p = op["path"]
+            if status.get(p) != "removed": status[p] = "added"
         elif op["op"] == "DropField":
-            drop_nodes.add(op["path"])
-        elif op["op"] in ("RenameField","MoveField","ChangeType","ToArray","ToScalar",
-                          "AddRange","ModifyRange","DropRange",
-                          "AddEnum","ModifyEnum","DropEnum",
-                          "AddRequired","DropRequired","AddItemsConstraint","ModifyItemsConstraint","DropItemsConstraint"):
+            status[op["path"]] = "removed"
+        elif op["op"] in _CHG_OPS:
             # 统一当作 changed
-            for k in ("path","from","to"):
-                if k in op and isinstance(op[k], str):
-                    chg_nodes.add(op[k])
-
-    # 合并两版的节点用于画一棵“对齐树”
-    all_nodes = set(idxA.keys()) | set(idxB.keys())
-    lines = [
-        "flowchart TD",
-        f'%% diff {baseA} -> {baseB}',
-        'classDef added fill:#e6ffed,stroke:#2ecc71;'
-        'classDef removed fill:#ffecec,stroke:#e74c3c;'
-        'classDef changed fill:#fffbe6,stroke:#f1c40f;',
-    ]
+            for v in (op.get("path"), op.get("from"), op.get("to")):
+                if isinstance(v, str) and v not in status: status[v] = "changed"
+
+    # 合并两版的节点用于画一棵“对齐树”；节点声明、连边、上色在同一趟里输出
+    all_nodes = idxA.keys() | idxB.keys()
+    yield "flowchart TD"
+    yield f'%% diff {baseA} -> {baseB}'
+    yield ('classDef added fill:#e6ffed,stroke:#2ecc71;'
+           'classDef removed fill:#ffecec,stroke:#e74c3c;'
+           'classDef changed fill:#fffbe6,stroke:#f1c40f;')
     for p in sorted(all_nodes):
-        nid = p.replace(".","_").replace("[]","Arr")
-        label = p.split(".")[-1]
+        parent, label, nid = meta[p]
         btA = idxA.get(p, {}).get("bsonType")
         btB = idxB.get(p, {}).get("bsonType")
         bt = btB or btA
-        lines.append(f'{nid}["{label}\\n({bt})"]')
+        yield f'{nid}["{label}\\n({bt})"]'
         if "." in p:
-            parent = ".".join(p.split(".")[:-1])
-            pid = parent.replace(".","_").replace("[]","Arr")
-            lines.append(f"{pid} --> {nid}")
-
-    # 上色
-    for p in add_nodes:
-        nid = p.replace(".","_").replace("[]","Arr")
-        lines.append(f"class {nid} added;")
-    for p in drop_nodes:
-        nid = p.replace(".","_").replace("[]","Arr")
-        lines.append(f"class {nid} removed;")
-    for p in chg_nodes:
-        nid = p.replace(".","_").replace("[]","Arr")
-        lines.append(f"class {nid} changed;")
-    return "\n".join(lines)
+            pid = meta[parent][2] if parent in meta else _nid(parent)
+            yield f"{pid} --> {nid}"
+        cls = status.pop(p, None)
+        if cls is not None:
+            yield f"class {nid} {cls};"
+    # ops 里不对应树节点的路径（如 AddRequired 的子字段名）照旧追加在末尾
+    for p in sorted(status):
+        yield f"class {_nid(p)} {status[p]};"
 
 # --------------------- 主流程 ---------------------
 
-def main():
+def _write_mmd(path: str, render: Any, args: Tuple[Any, ...]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        render(*args, out=f)
+
+def main() -> None:
     if len(sys.argv) != 3:
         print("Usage: python schema_diff.py <old_schema.json> <new_schema.json>")
         sys.exit(1)
@@ -291,20 +447,21 @@ def main():
 
     # 写操作序列
     ops_path = f"operations_{baseA}_to_{baseB}.json"
-    with open(ops_path, "w", encoding="utf-8") as f:
-        json.dump(ops, f, ensure_ascii=False, indent=2)
+    dump_ops(ops, ops_path)
     print("Wrote", ops_path)
 
-    # 单版树
-    with open(f"tree_{baseA}.mmd","w",encoding="utf-8") as f:
-        f.write(mmd_tree(idxA, baseA))
-    with open(f"tree_{baseB}.mmd","w",encoding="utf-8") as f:
-        f.write(mmd_tree(idxB, baseB))
+    # 单版树 + diff 树：三张图互不依赖，交给线程池并发渲染/写盘（路径拆分结果在三张图之间复用）。
+    # 按文件名去重：两版同名时 tree_<A>.mmd 与 tree_<B>.mmd 是同一个文件，和顺序写一样保留 B 的树
+    metaA, metaB = path_meta(idxA), path_meta(idxB)
+    jobs: Dict[str, Tuple[Any, Tuple[Any, ...]]] = {}
+    jobs[f"tree_{baseA}.mmd"] = (mmd_tree, (idxA, baseA, metaA))
+    jobs[f"tree_{baseB}.mmd"] = (mmd_tree, (idxB, baseB, metaB))
+    jobs[f"diff_tree_{baseA}_to_{baseB}.mmd"] = (mmd_diff_tree, (idxA, idxB, baseA, baseB, ops, {**metaA, **metaB}))
+    with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+        futures = [ex.submit(_write_mmd, path, render, args) for path, (render, args) in jobs.items()]
+        for fut in futures:
+            fut.result()
     print("Wrote", f"tree_{baseA}.mmd", f"tree_{baseB}.mmd")
-
-    # diff 树
-    with open(f"diff_tree_{baseA}_to_{baseB}.mmd","w",encoding="utf-8") as f:
-        f.write(mmd_diff_tree(idxA, idxB, baseA, baseB, ops))
     print("Wrote", f"diff_tree_{baseA}_to_{baseB}.mmd")
 
 if __name__ == "__main__":